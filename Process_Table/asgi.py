@@ -13,4 +13,5 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Process_Table.settings')
 
+# 请求指标（app.metrics）和按需性能分析（app.profiling）以中间件实现，WSGI和ASGI入口均生效
 application = get_asgi_application()
@@ -44,11 +44,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 放在最外层，统计包含其余中间件在内的请求耗时
+    'app.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # 管理员按需开启的性能分析，需要在认证之后判断用户
+    'app.profiling.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,13 +80,115 @@ WSGI_APPLICATION = 'Process_Table.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite 生产配置，在每个新连接上执行：
+# WAL 模式下读写互不阻塞；synchronous=NORMAL 在 WAL 模式下仍能保证一致性；
+# 通过内存映射 I/O 和较大的页缓存减少读取时的系统调用
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f"PRAGMA mmap_size={int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))}",
+    # 负数表示以 KiB 为单位
+    f"PRAGMA cache_size=-{int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))}",
+    'PRAGMA temp_store=MEMORY',
+]
+
+
+def env_bool(environ, key, default):
+    return environ.get(key, str(default)).lower() == 'true'
+
+
+def build_database_config(environ):
+    """根据环境变量生成默认数据库配置
+
+    DATABASE_ENGINE 未设置时使用 SQLite；设置为 PostgreSQL 等数据库时读取
+    DATABASE_NAME/USER/PASSWORD/HOST/PORT。默认保持持久连接（CONN_MAX_AGE），
+    并在复用连接前做健康检查；PostgreSQL 设置 DATABASE_POOL=True 时改用连接池。
+    """
+    engine = environ.get('DATABASE_ENGINE', 'django.db.backends.sqlite3')
+    conn_max_age = environ.get('DATABASE_CONN_MAX_AGE', '60')
+    config = {
+        'ENGINE': engine,
+        # 空值表示连接不过期
+        'CONN_MAX_AGE': int(conn_max_age) if conn_max_age else None,
+        'CONN_HEALTH_CHECKS': env_bool(environ, 'DATABASE_CONN_HEALTH_CHECKS', True),
+    }
+    if engine == 'django.db.backends.sqlite3':
+        config.update({
+            'NAME': environ.get('DATABASE_NAME', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # 获取锁失败时的等待时间（秒），避免并发报工时直接报错 database is locked
+                'timeout': float(environ.get('SQLITE_BUSY_TIMEOUT', '20')),
+                # 事务开始时即获取写锁，避免读事务中途升级为写事务时无法等待锁而失败
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': ';'.join(SQLITE_PRAGMAS),
+            },
+        })
+        return config
+
+    config.update({
+        'NAME': environ.get('DATABASE_NAME', ''),
+        'USER': environ.get('DATABASE_USER', ''),
+        'PASSWORD': environ.get('DATABASE_PASSWORD', ''),
+        'HOST': environ.get('DATABASE_HOST', ''),
+        'PORT': environ.get('DATABASE_PORT', ''),
+        'OPTIONS': {},
+    })
+    if engine == 'django.db.backends.postgresql' and env_bool(environ, 'DATABASE_POOL', False):
+        # 连接池（需要 psycopg[pool]）与持久连接不能同时使用
+        config['OPTIONS']['pool'] = {
+            'min_size': int(environ.get('DATABASE_POOL_MIN_SIZE', '2')),
+            'max_size': int(environ.get('DATABASE_POOL_MAX_SIZE', '10')),
+            'timeout': float(environ.get('DATABASE_POOL_TIMEOUT', '10')),
+        }
+        config['CONN_MAX_AGE'] = 0
+    return config
+
+
 DATABASES = {
+    'default': build_database_config(os.environ),
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 缓存版本号必须在所有进程（uvicorn工作进程、拆分工作进程）之间共享，否则其他进程读到的缓存不会失效。
+# 默认使用同一主机上各进程共享的文件缓存；多台主机部署时请通过环境变量配置 Redis 等共享缓存。
+# 不能使用进程内的 LocMemCache（系统检查会给出警告）。
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '10000')),
+        },
     }
 }
 
+# 工序、工艺路线读接口响应缓存的过期时间（秒）
+API_CACHE_TIMEOUT = int(os.environ.get('API_CACHE_TIMEOUT', '300'))
+
+# 工单拆分工作进程数量、队列为空时的轮询间隔（秒）、判定拆分任务超时需重新入队的时间（秒），
+# 以及工作进程检查超时任务的间隔（秒）
+SPLIT_WORKERS = int(os.environ.get('SPLIT_WORKERS', '2'))
+SPLIT_POLL_INTERVAL = float(os.environ.get('SPLIT_POLL_INTERVAL', '1'))
+SPLIT_STALE_AFTER = int(os.environ.get('SPLIT_STALE_AFTER', '600'))
+SPLIT_REQUEUE_INTERVAL = float(os.environ.get('SPLIT_REQUEUE_INTERVAL', '60'))
+
+# 进程内缓存的工艺路线结构数量上限
+ROUTE_STRUCTURE_CACHE_SIZE = int(os.environ.get('ROUTE_STRUCTURE_CACHE_SIZE', '1024'))
+
+# 慢请求预算：耗时（秒）或SQL查询数超过该值时记录慢请求日志
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1'))
+SLOW_REQUEST_QUERIES = int(os.environ.get('SLOW_REQUEST_QUERIES', '50'))
+
+# 性能分析：管理员请求携带 X-Profile 请求头（或开启 PROFILER_ALWAYS 后的每个管理员请求）时记录cProfile和SQL，
+# 结果写入 PROFILER_DIR，只保留最近 PROFILER_MAX_FILES 次
+PROFILER_HEADER = 'HTTP_X_PROFILE'
+PROFILER_ALWAYS = env_bool(os.environ, 'PROFILER_ALWAYS', False)
+PROFILER_DIR = os.environ.get('PROFILER_DIR', BASE_DIR / 'profiles')
+PROFILER_MAX_FILES = int(os.environ.get('PROFILER_MAX_FILES', '50'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,9 +233,25 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-REST_FRAMEWORK = {
-    'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',  # JSON 渲染器
-        'rest_framework.renderers.BrowsableAPIRenderer',  # 浏览器渲染器
+def build_renderer_classes(debug):
+    """JSON（orjson）和MessagePack渲染器，可浏览API只在DEBUG模式下启用"""
+    renderers = [
+        'app.renderers.ORJSONRenderer',  # JSON 渲染器
+        'app.renderers.MessagePackRenderer',  # MessagePack 渲染器，供终端使用
     ]
+    if debug:
+        renderers.append('rest_framework.renderers.BrowsableAPIRenderer')  # 浏览器渲染器
+    return renderers
+
+
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': build_renderer_classes(DEBUG),
+    'DEFAULT_PARSER_CLASSES': [
+        'app.renderers.ORJSONParser',
+        'app.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # 列表接口统一使用按主键排序的游标分页
+    'DEFAULT_PAGINATION_CLASS': 'app.pagination.IdCursorPagination',
 }
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class AppCustomConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # 注册模型信号，写入时使缓存失效
+        from . import signals  # noqa: F401
+        # 检查缓存后端能否在进程间共享版本号
+        from django.core import checks
+        from .cache import check_shared_cache
+        checks.register(check_shared_cache)
+        # 为每个数据库连接注册SQL统计和性能分析的SQL记录
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_recorder
+        from .profiling import install_query_tracer
+        connection_created.connect(install_query_recorder)
+        connection_created.connect(install_query_tracer)
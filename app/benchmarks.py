@@ -0,0 +1,203 @@
+"""接口基准测试
+
+在当前数据库（通常由 seed_data 命令生成）上重复请求各接口，统计耗时分位数和SQL查询数。
+报工、拆分等写操作在事务中执行，结束时整体回滚，不改变数据。
+结果可与阈值文件及上一次的结果比较，超出时视为性能回退。
+另外比较各渲染器编码大任务列表的耗时和响应大小。
+"""
+import math
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from .models import Process, Route, Task, WorkOrder, WorkOrderProgress
+from .renderers import MessagePackRenderer, ORJSONRenderer
+from .serializers import TaskValuesSerializer
+
+
+def sample_objects():
+    """选取基准测试使用的对象：任务最多的已排产工单及其可开工任务"""
+    progress = (
+        WorkOrderProgress.objects.filter(work_order__is_scheduled=True, active_step__isnull=False)
+        .order_by('-pending_count', 'work_order_id')
+        .select_related('work_order')
+        .first()
+    )
+    if progress is None:
+        return None
+    task = Task.objects.filter(work_order_id=progress.work_order_id, is_ready=True).first()
+    if task is None:
+        return None
+    return {
+        'work_order': progress.work_order,
+        'route': progress.work_order.route_id,
+        'task': task,
+        'process': task.process_id,
+    }
+
+
+def endpoints(sample):
+    """返回 [(名称, 请求方法, 路径, 请求体生成函数或None)]，请求体生成函数接收迭代序号"""
+    work_order = sample['work_order'].id
+    task = sample['task']
+    # 可开工任务在未生产和未报工之间来回切换，两种变更都符合前后置规则
+    toggled = ['unreported', 'pending'] if task.status == 'pending' else ['pending', 'unreported']
+    return [
+        ('processes.list', 'get', '/api/processes/', None),
+        ('processes.detail', 'get', f"/api/processes/{sample['process']}/", None),
+        ('processes.ready_tasks', 'get', f"/api/processes/{sample['process']}/ready-tasks/", None),
+        ('routes.list', 'get', '/api/routes/?page_size=20', None),
+        ('routes.list_sparse', 'get', '/api/routes/?page_size=20&fields=id,name', None),
+        ('routes.detail', 'get', f"/api/routes/{sample['route']}/", None),
+        ('workorders.list', 'get', '/api/workorders/', None),
+        ('workorders.detail', 'get', f'/api/workorders/{work_order}/', None),
+        ('tasks.list', 'get', '/api/tasks/', None),
+        ('tasks.list_sparse', 'get', '/api/tasks/?fields=id,status', None),
+        ('tasks.list_by_work_order', 'get', f'/api/tasks/?work_order={work_order}', None),
+        ('tasks.detail', 'get', f'/api/tasks/{task.id}/', None),
+        ('async.tasks.list', 'get', '/api/async/tasks/', None),
+        ('tasks.status_change', 'patch', f'/api/tasks/{task.id}/', lambda i: {'status': toggled[i % 2]}),
+        ('tasks.batch_report', 'post', '/api/tasks/batch-report/',
+         lambda i: {'items': [{'id': task.id, 'status': toggled[i % 2]}]}),
+        ('workorders.split', 'post', f'/api/workorders/{work_order}/split/', None),
+    ]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def measure(call, iterations, warmup):
+    """执行call（接收迭代序号，返回状态码），返回耗时统计、最大查询数和非2xx状态码"""
+    durations = []
+    queries = 0
+    errors = set()
+    for i in range(warmup + iterations):
+        # 清空响应缓存，测量查询数据库的路径
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            status_code = call(i)
+            duration = time.perf_counter() - start
+        if i < warmup:
+            continue
+        durations.append(duration * 1000)
+        queries = max(queries, len(captured))
+        if not 200 <= status_code < 300:
+            errors.add(status_code)
+    return {
+        'p50_ms': round(percentile(durations, 0.5), 3),
+        'p95_ms': round(percentile(durations, 0.95), 3),
+        'p99_ms': round(percentile(durations, 0.99), 3),
+        'mean_ms': round(sum(durations) / len(durations), 3),
+        'queries': queries,
+        'errors': sorted(errors),
+    }
+
+
+RENDERERS = {
+    'json': JSONRenderer,
+    'orjson': ORJSONRenderer,
+    'msgpack': MessagePackRenderer,
+}
+
+
+def benchmark_renderers(rows=10000, iterations=20, warmup=2):
+    """比较各渲染器编码一页大任务列表的耗时和响应大小"""
+    data = {
+        'next': None,
+        'previous': None,
+        'results': TaskValuesSerializer.serialize(TaskValuesSerializer.values(Task.objects.order_by('id')[:rows])),
+    }
+    results = {}
+    for name, renderer_class in RENDERERS.items():
+        renderer = renderer_class()
+        durations = []
+        for i in range(warmup + iterations):
+            start = time.perf_counter()
+            content = renderer.render(data, renderer.media_type, {})
+            if i >= warmup:
+                durations.append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'rows': len(data['results']),
+            'p50_ms': round(percentile(durations, 0.5), 3),
+            'p95_ms': round(percentile(durations, 0.95), 3),
+            'bytes': len(content),
+        }
+    return results
+
+
+def run_benchmarks(iterations=20, warmup=2, only=None):
+    """运行全部（或only中列出的）基准测试，返回结果字典"""
+    from .views import WorkOrderViewSet
+
+    sample = sample_objects()
+    if sample is None:
+        raise ValueError("数据库中没有已排产且有可开工任务的工单，请先运行 seed_data 生成数据。")
+    client = Client()
+    results = {}
+    with transaction.atomic():
+        for name, method, path, body in endpoints(sample):
+            if only and name not in only:
+                continue
+            def call(i, method=method, path=path, body=body):
+                data = body(i) if body else None
+                kwargs = {'data': data, 'content_type': 'application/json'} if data is not None else {}
+                return getattr(client, method)(path, **kwargs).status_code
+            results[name] = {'method': method.upper(), 'path': path, **measure(call, iterations, warmup)}
+
+        # 直接执行拆分（工单已拆分过，测量比对现有任务的路径），不经过任务队列
+        if not only or 'split.run' in only:
+            def split(i):
+                WorkOrderViewSet().split_work_order(sample['work_order'])
+                return 200
+            results['split.run'] = {'method': None, 'path': None, **measure(split, iterations, warmup)}
+        transaction.set_rollback(True)
+
+    renderers = benchmark_renderers(iterations=iterations, warmup=warmup) if not only or 'renderers' in only else {}
+
+    return {
+        'meta': {
+            'iterations': iterations,
+            'warmup': warmup,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'dataset': {
+                'processes': Process.objects.count(),
+                'routes': Route.objects.count(),
+                'work_orders': WorkOrder.objects.count(),
+                'tasks': Task.objects.count(),
+                'sample_route_steps': len(sample['work_order'].route.routeprocess_set.all()),
+            },
+        },
+        'results': results,
+        'renderers': renderers,
+    }
+
+
+def check_regressions(results, thresholds=None, baseline=None, tolerance=0.25):
+    """比较结果与阈值及基线结果，返回回退说明列表
+
+    thresholds 格式为 {名称: {"queries": 最大查询数, "p95_ms": 最大p95耗时}}；
+    与基线比较时查询数不能增加，p95耗时不能超过基线的 (1 + tolerance) 倍。
+    """
+    failures = []
+    for name, result in results['results'].items():
+        if result['errors']:
+            failures.append(f"{name}: 返回了非2xx状态码 {result['errors']}")
+        limit = (thresholds or {}).get(name, {})
+        if 'queries' in limit and result['queries'] > limit['queries']:
+            failures.append(f"{name}: SQL查询数 {result['queries']} 超过阈值 {limit['queries']}")
+        if 'p95_ms' in limit and result['p95_ms'] > limit['p95_ms']:
+            failures.append(f"{name}: p95耗时 {result['p95_ms']}ms 超过阈值 {limit['p95_ms']}ms")
+        previous = (baseline or {}).get('results', {}).get(name)
+        if previous:
+            if result['queries'] > previous['queries']:
+                failures.append(f"{name}: SQL查询数从 {previous['queries']} 增加到 {result['queries']}")
+            if result['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                failures.append(f"{name}: p95耗时从 {previous['p95_ms']}ms 增加到 {result['p95_ms']}ms")
+    return failures
@@ -0,0 +1,188 @@
+"""工序和工艺路线的缓存
+
+每类资源（以及其中的每个对象）对应一个版本号，版本号取最近一次写入的时间戳。
+读接口的响应缓存键和ETag由请求的绝对地址、渲染格式及其依赖的版本号计算得出；
+进程内的工艺路线结构缓存同样按版本号校验，写入时更新版本号即可让相关缓存全部失效。
+"""
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+VERSION_KEY_PREFIX = 'api_version:'
+RESPONSE_KEY_PREFIX = 'api_response:'
+
+
+def versions_shared():
+    """版本号是否保存在各进程共享的缓存中，进程内的LocMemCache只对当前进程可见"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    """系统检查：缓存后端为进程内缓存时，其他进程的写入无法使本进程的缓存失效"""
+    if versions_shared():
+        return []
+    return [checks.Warning(
+        "缓存后端为进程内的 LocMemCache，多进程部署时各进程的缓存版本号互不可见，会读到过期的响应和工艺路线结构。",
+        hint="请使用 FileBasedCache（默认）、Redis 等各进程共享的缓存后端。",
+        id='app.W001',
+    )]
+
+
+def get_versions(names):
+    """获取各资源的版本号，缺失的版本号以当前时间初始化"""
+    keys = [VERSION_KEY_PREFIX + name for name in names]
+    versions = cache.get_many(keys)
+    missing = {key: time.time() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def touch(*names):
+    """资源发生写入时更新其版本号，并在事务提交后再更新一次，避免提交前读到的旧数据被缓存"""
+    def bump():
+        cache.set_many({VERSION_KEY_PREFIX + name: time.time() for name in names}, timeout=None)
+    bump()
+    transaction.on_commit(bump)
+
+
+def touch_process(process_id=None):
+    names = ['process'] + ([f'process:{process_id}'] if process_id is not None else [])
+    touch(*names)
+
+
+def touch_route(*route_ids):
+    touch('route', *[f'route:{route_id}' for route_id in route_ids])
+
+
+class RouteStructure:
+    """编译后的工艺路线结构：按顺序排列的工艺路线工序关系ID、工序ID及顺序值"""
+    def __init__(self, steps):
+        self.route_process_ids = [step[0] for step in steps]
+        self.process_ids = [step[1] for step in steps]
+        self.orders = [step[2] for step in steps]
+        self.positions = {route_process_id: index for index, route_process_id in enumerate(self.route_process_ids)}
+
+    def __len__(self):
+        return len(self.route_process_ids)
+
+    def split_at(self, order):
+        """返回顺序值小于和大于order的工艺路线工序关系ID"""
+        return (
+            self.route_process_ids[:bisect.bisect_left(self.orders, order)],
+            self.route_process_ids[bisect.bisect_right(self.orders, order):],
+        )
+
+
+class RouteStructureCache:
+    """按版本号校验的进程内LRU缓存，供拆分工单和任务状态校验读取工艺路线结构"""
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, route_id):
+        # 版本号不在进程间共享时无法得知其他进程的修改，直接从数据库读取
+        if not versions_shared():
+            return self.load(route_id)
+        # 删除工序会级联删除工序关系，因此同时依赖工序的版本号
+        version = get_versions([f'route:{route_id}', 'process'])
+        with self.lock:
+            entry = self.entries.get(route_id)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(route_id)
+                return entry[1]
+
+        structure = self.load(route_id)
+        with self.lock:
+            self.entries[route_id] = (version, structure)
+            self.entries.move_to_end(route_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return structure
+
+    def load(self, route_id):
+        from .models import RouteProcess
+        return RouteStructure(
+            RouteProcess.objects.filter(route_id=route_id).order_by('order').values_list('id', 'process_id', 'order')
+        )
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+route_structures = RouteStructureCache(settings.ROUTE_STRUCTURE_CACHE_SIZE)
+
+
+class CachedReadMixin:
+    """为list和retrieve提供按版本号失效的响应缓存及ETag条件请求支持
+
+    子类通过 cache_dependencies 返回当前请求依赖的版本号名称。
+    可浏览API只做条件请求判断，不缓存渲染结果。
+    """
+    cached_formats = ('json', 'msgpack')
+
+    def cache_dependencies(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_read(request) or super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_read(request) or super().retrieve(request, *args, **kwargs)
+
+    def cached_read(self, request):
+        """命中缓存或条件请求成立时直接返回响应，否则记录缓存键并返回None"""
+        versions = get_versions(self.cache_dependencies())
+        renderer_format = request.accepted_renderer.format
+        # 分页链接是包含主机和协议的绝对地址，签名同样使用绝对地址
+        signature = f"{request.build_absolute_uri()}|{renderer_format}|{versions}"
+        self.cache_etag = '"%s"' % hashlib.md5(signature.encode('utf-8')).hexdigest()
+
+        # 条件请求成立时返回304（或412），不再查询和渲染
+        # 版本号精确到秒以下，同一秒内的多次写入无法用Last-Modified区分，因此只按ETag判断
+        response = get_conditional_response(request, etag=self.cache_etag)
+        if response is not None:
+            return self.set_cache_headers(response)
+
+        self.cache_key = None
+        if renderer_format in self.cached_formats:
+            self.cache_key = RESPONSE_KEY_PREFIX + self.cache_etag.strip('"')
+            entry = cache.get(self.cache_key)
+            if entry is not None:
+                cached = HttpResponse(entry['content'], content_type=entry['content_type'])
+                return self.set_cache_headers(cached)
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cache_key = getattr(self, 'cache_key', None)
+        if cache_key and isinstance(response, Response) and response.status_code == 200:
+            response.render()
+            cache.set(
+                cache_key,
+                {'content': response.content, 'content_type': response['Content-Type']},
+                timeout=settings.API_CACHE_TIMEOUT,
+            )
+        if getattr(self, 'cache_etag', None) and response.status_code == 200:
+            self.set_cache_headers(response)
+        return response
+
+    def set_cache_headers(self, response):
+        response['ETag'] = self.cache_etag
+        # 客户端每次使用前都需要携带ETag重新验证
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,110 @@
+"""基于数据库的工单拆分任务队列
+
+拆分请求只负责入队并立即返回任务ID，由 run_split_workers 命令启动的工作进程领取并执行。
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import SplitJob, WorkOrder
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_split(work_order):
+    """为工单创建拆分任务，已有排队中或拆分中的任务时直接返回该任务
+
+    返回 (任务, 是否合并到已有任务)。
+    """
+    job = SplitJob.objects.filter(work_order=work_order, status__in=SplitJob.ACTIVE_STATUSES).first()
+    if job is not None:
+        return job, True
+    try:
+        with transaction.atomic():
+            job = SplitJob.objects.create(work_order=work_order)
+    except IntegrityError:
+        # 并发请求已为该工单创建了任务
+        job = SplitJob.objects.get(work_order=work_order, status__in=SplitJob.ACTIVE_STATUSES)
+        return job, True
+    logger.info(f"工单 {work_order.id} 拆分任务 {job.id} 已入队。")
+    return job, False
+
+
+def enqueue_splits(work_order_ids):
+    """批量为工单创建拆分任务，已有排队中或拆分中任务的工单合并到该任务
+
+    返回 ({工单ID: 任务}, 合并到已有任务的工单ID集合)。
+    """
+    active = SplitJob.objects.filter(work_order_id__in=work_order_ids, status__in=SplitJob.ACTIVE_STATUSES)
+    coalesced = set(active.values_list('work_order_id', flat=True))
+    # 并发请求可能已创建了任务，由唯一约束忽略冲突
+    SplitJob.objects.bulk_create(
+        [SplitJob(work_order_id=work_order_id) for work_order_id in work_order_ids if work_order_id not in coalesced],
+        ignore_conflicts=True,
+    )
+    jobs = {job.work_order_id: job for job in active.all()}
+    logger.info(f"批量拆分 {len(work_order_ids)} 个工单，新入队 {len(work_order_ids) - len(coalesced)} 个拆分任务。")
+    return jobs, coalesced
+
+
+def claim_next_job():
+    """领取最早入队的任务并标记为拆分中，没有可领取的任务时返回None"""
+    while True:
+        job_id = (
+            SplitJob.objects.filter(status='queued').order_by('id').values_list('id', flat=True).first()
+        )
+        if job_id is None:
+            return None
+        # 条件更新保证多个工作进程不会领取同一个任务
+        claimed = SplitJob.objects.filter(id=job_id, status='queued').update(
+            status='running', started_at=timezone.now()
+        )
+        if claimed:
+            return SplitJob.objects.select_related('work_order').get(id=job_id)
+
+
+def run_split_job(job):
+    """执行拆分任务，并记录结果或失败原因"""
+    from .views import WorkOrderViewSet
+
+    try:
+        with transaction.atomic():
+            work_order = WorkOrder.objects.select_for_update().get(id=job.work_order_id)
+            if work_order.status != 'approved':
+                raise ValueError(f"工单状态为 {work_order.status}，只有已审核的工单才能拆分。")
+            # 工作进程与接口进程分离，工艺路线结构在锁定工单后直接从数据库读取，不依赖缓存失效
+            result = WorkOrderViewSet().split_work_order(work_order, fresh=True)
+            # 更新工单的已排产状态
+            WorkOrder.objects.filter(id=work_order.id).update(is_scheduled=True)
+            job.status = 'succeeded'
+            job.created_count = result['created']
+            job.kept_count = result['kept']
+            job.removed_count = result['removed']
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'created_count', 'kept_count', 'removed_count', 'finished_at'])
+    except Exception as e:
+        logger.error(f"拆分任务 {job.id}（工单 {job.work_order_id}）失败: {str(e)}")
+        job.status = 'failed'
+        job.error = str(e) if isinstance(e, ValueError) else "拆分工单失败，请联系管理员。"
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def process_next_job():
+    """领取并执行一个任务，返回执行过的任务或None"""
+    job = claim_next_job()
+    if job is not None:
+        run_split_job(job)
+    return job
+
+
+def requeue_stale_jobs(stale_after):
+    """把开始超过stale_after秒仍处于拆分中的任务（通常是工作进程异常退出）重新入队"""
+    deadline = timezone.now() - timedelta(seconds=stale_after)
+    count = SplitJob.objects.filter(status='running', started_at__lt=deadline).update(status='queued', started_at=None)
+    if count:
+        logger.warning(f"{count} 个超时的拆分任务已重新入队。")
+    return count
@@ -0,0 +1,52 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import check_regressions, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = "在当前数据库上运行接口基准测试，输出JSON结果，超出阈值或相对基线回退时失败"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="每个接口的测量次数")
+        parser.add_argument('--warmup', type=int, default=2, help="每个接口测量前的预热次数")
+        parser.add_argument('--only', nargs='*', help="只运行指定名称的基准测试")
+        parser.add_argument('--output', default='benchmark-results.json', help="结果JSON文件路径")
+        parser.add_argument(
+            '--thresholds', default=str(settings.BASE_DIR / 'benchmarks' / 'thresholds.json'),
+            help="阈值JSON文件路径，文件不存在时不检查阈值",
+        )
+        parser.add_argument('--baseline', help="作为基线的上一次结果JSON文件路径")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="相对基线允许的p95耗时增幅")
+
+    def handle(self, *args, **options):
+        try:
+            results = run_benchmarks(options['iterations'], options['warmup'], options['only'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        Path(options['output']).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        for name, result in results['results'].items():
+            self.stdout.write(
+                f"{name:<28} p50 {result['p50_ms']:>9.2f}ms  p95 {result['p95_ms']:>9.2f}ms  "
+                f"p99 {result['p99_ms']:>9.2f}ms  查询 {result['queries']}"
+            )
+        for name, result in results['renderers'].items():
+            self.stdout.write(
+                f"渲染 {result['rows']} 个任务 {name:<10} p50 {result['p50_ms']:>9.2f}ms  "
+                f"p95 {result['p95_ms']:>9.2f}ms  大小 {result['bytes']} 字节"
+            )
+        self.stdout.write(f"结果已写入 {options['output']}。")
+
+        thresholds_path = Path(options['thresholds'])
+        thresholds = json.loads(thresholds_path.read_text(encoding='utf-8')) if thresholds_path.exists() else None
+        baseline = None
+        if options['baseline']:
+            baseline = json.loads(Path(options['baseline']).read_text(encoding='utf-8'))
+        failures = check_regressions(results, thresholds, baseline, options['tolerance'])
+        if failures:
+            raise CommandError("性能回退：\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("所有基准测试均在阈值内。"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import WorkOrder
+from app.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "从任务表重建工单进度汇总，默认只补齐缺少汇总记录的工单"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="重建所有工单的进度汇总")
+        parser.add_argument('--batch-size', type=int, default=1000, help="每批处理的工单数量")
+
+    def handle(self, *args, **options):
+        queryset = WorkOrder.objects.order_by('id')
+        if not options['all']:
+            queryset = queryset.filter(progress__isnull=True)
+        work_order_ids = list(queryset.values_list('id', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(work_order_ids), batch_size):
+            with transaction.atomic():
+                rebuild_progress(work_order_ids[start:start + batch_size])
+        self.stdout.write(f"已重建 {len(work_order_ids)} 个工单的进度汇总。")
@@ -0,0 +1,93 @@
+import logging
+import multiprocessing
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from app.jobs import process_next_job, requeue_stale_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class SplitWorker:
+    """拆分工作进程的主循环：领取并执行拆分任务，定期把超时的任务重新入队"""
+    def __init__(self, poll_interval, stale_after, requeue_interval):
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.requeue_interval = requeue_interval
+        self.last_requeue = time.monotonic()
+
+    def run_once(self):
+        """执行一次循环，返回执行过的任务，队列为空或出错时返回None"""
+        # 与请求处理一致，在每个任务前后关闭超过 CONN_MAX_AGE 或已失效的数据库连接
+        close_old_connections()
+        try:
+            if time.monotonic() - self.last_requeue >= self.requeue_interval:
+                self.last_requeue = time.monotonic()
+                requeue_stale_jobs(self.stale_after)
+            return process_next_job()
+        except Exception:
+            # 数据库被锁、连接断开等错误不能让工作进程退出，等待后重试
+            logger.exception("拆分工作进程执行出错，稍后重试。")
+            return None
+        finally:
+            close_old_connections()
+
+    def run(self):
+        while True:
+            if self.run_once() is None:
+                time.sleep(self.poll_interval)
+
+
+def worker_loop(poll_interval, stale_after, requeue_interval):
+    """工作进程：循环领取并执行拆分任务，队列为空时等待"""
+    # 子进程不能复用父进程的数据库连接
+    connections.close_all()
+    try:
+        SplitWorker(poll_interval, stale_after, requeue_interval).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "启动工单拆分工作进程池，处理数据库中的拆分任务队列"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.SPLIT_WORKERS, help="工作进程数量")
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.SPLIT_POLL_INTERVAL, help="队列为空时的轮询间隔（秒）"
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=settings.SPLIT_STALE_AFTER,
+            help="把开始超过该秒数仍未完成的任务重新入队",
+        )
+        parser.add_argument(
+            '--requeue-interval', type=float, default=settings.SPLIT_REQUEUE_INTERVAL,
+            help="工作进程检查超时任务的间隔（秒）",
+        )
+
+    def handle(self, *args, **options):
+        requeue_stale_jobs(options['stale_after'])
+        connections.close_all()
+
+        processes = [
+            multiprocessing.Process(
+                target=worker_loop,
+                args=(options['poll_interval'], options['stale_after'], options['requeue_interval']),
+                daemon=True,
+            )
+            for _ in range(options['workers'])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"已启动 {len(processes)} 个拆分工作进程。")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,126 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from app.cache import route_structures, touch_process, touch_route
+from app.models import Process, Route, RouteProcess, SplitJob, Task, WorkOrder, WorkOrderProgress
+from app.progress import rebuild_progress
+
+
+class Command(BaseCommand):
+    help = "生成可复现的合成数据集（工序、工艺路线、工单和任务），供基准测试使用"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=5000, help="工序数量")
+        parser.add_argument('--routes', type=int, default=20000, help="工艺路线数量（每条工艺路线对应一个工单）")
+        parser.add_argument('--min-steps', type=int, default=10, help="每条工艺路线的最少工序数")
+        parser.add_argument('--max-steps', type=int, default=300, help="每条工艺路线的最多工序数")
+        parser.add_argument('--tasks', type=int, default=1000000, help="任务数量上限，按工单依次拆分直到达到该数量")
+        parser.add_argument('--seed', type=int, default=42, help="随机数种子，相同参数和种子生成相同的数据")
+        parser.add_argument('--batch-size', type=int, default=1000, help="每个事务写入的工艺路线/工单数量")
+        parser.add_argument('--clear', action='store_true', help="生成前清空现有数据")
+
+    def handle(self, *args, **options):
+        if not 1 <= options['min_steps'] <= options['max_steps']:
+            raise CommandError("工序数范围无效。")
+        if options['clear']:
+            self.clear()
+        elif Process.objects.exists() or Route.objects.exists():
+            raise CommandError("数据库中已有数据，请使用 --clear 清空后再生成。")
+
+        rng = random.Random(options['seed'])
+        process_ids = self.create_processes(options['processes'], options['batch_size'])
+        task_budget = options['tasks']
+        created_tasks = 0
+        for start in range(0, options['routes'], options['batch_size']):
+            count = min(options['batch_size'], options['routes'] - start)
+            with transaction.atomic():
+                created_tasks += self.create_batch(
+                    rng, start, count, process_ids, options['min_steps'], options['max_steps'],
+                    task_budget - created_tasks,
+                )
+            self.stdout.write(f"已生成 {start + count} 条工艺路线，{created_tasks} 个任务。")
+
+        # 批量写入不会触发信号，统一使缓存失效
+        touch_process()
+        touch_route()
+        route_structures.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"生成完成：{len(process_ids)} 个工序，{options['routes']} 条工艺路线及工单，{created_tasks} 个任务。"
+        ))
+
+    def clear(self):
+        """按依赖顺序逐表整体删除，不逐行加载对象和触发模型信号，结束时统一使缓存失效"""
+        with transaction.atomic(), connection.cursor() as cursor:
+            for model in (SplitJob, WorkOrderProgress, Task, WorkOrder, RouteProcess, Route, Process):
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(model._meta.db_table)}")
+        touch_process()
+        touch_route()
+        route_structures.clear()
+
+    def create_processes(self, count, batch_size):
+        processes = Process.objects.bulk_create(
+            [Process(name=f"工序{i:05d}", description=f"合成工序 {i}") for i in range(count)],
+            batch_size=batch_size,
+        )
+        return [process.id for process in processes]
+
+    def create_batch(self, rng, start, count, process_ids, min_steps, max_steps, task_budget):
+        """生成一批工艺路线及其工单，在任务数量上限内拆分工单，返回新建的任务数"""
+        routes = Route.objects.bulk_create(
+            [Route(name=f"工艺路线{start + i:06d}") for i in range(count)]
+        )
+        steps = {route.id: rng.randint(min_steps, max_steps) for route in routes}
+        route_processes = RouteProcess.objects.bulk_create(
+            [
+                RouteProcess(route=route, process_id=rng.choice(process_ids), order=(i + 1) * RouteProcess.ORDER_GAP)
+                for route in routes
+                for i in range(steps[route.id])
+            ],
+            batch_size=5000,
+        )
+
+        # 任务数量上限内的工单已审核并拆分，其余工单随机处于草稿、已提交或已审核状态
+        scheduled_route_ids = set()
+        for route in routes:
+            if steps[route.id] > task_budget:
+                break
+            scheduled_route_ids.add(route.id)
+            task_budget -= steps[route.id]
+        work_orders = WorkOrder.objects.bulk_create([
+            WorkOrder(
+                name=f"WO-{start + i:06d}",
+                route=route,
+                status='approved' if route.id in scheduled_route_ids else rng.choice(['draft', 'submitted', 'approved']),
+                is_scheduled=route.id in scheduled_route_ids,
+            )
+            for i, route in enumerate(routes)
+        ])
+
+        # 任务状态符合前后置规则：已完成的前缀、一道当前工序、其余为未生产
+        work_order_by_route = {work_order.route_id: work_order.id for work_order in work_orders}
+        tasks = []
+        position = {}
+        for route_process in route_processes:
+            if route_process.route_id not in scheduled_route_ids:
+                continue
+            index = position.get(route_process.route_id, 0)
+            position[route_process.route_id] = index + 1
+            if index == 0:
+                progress = rng.randint(0, steps[route_process.route_id])
+            if index < progress:
+                task_status = 'completed'
+            elif index == progress:
+                task_status = rng.choice(['pending', 'unreported', 'in_progress'])
+            else:
+                task_status = 'pending'
+            tasks.append(Task(
+                work_order_id=work_order_by_route[route_process.route_id],
+                process_id=route_process.process_id,
+                route_process_id=route_process.id,
+                status=task_status,
+            ))
+        Task.objects.bulk_create(tasks, batch_size=5000)
+        rebuild_progress([work_order.id for work_order in work_orders])
+        return len(tasks)
@@ -0,0 +1,171 @@
+"""请求级性能指标
+
+中间件按视图名和请求方法把每个请求的耗时、SQL查询数和数据库耗时记入进程内直方图，
+由 /api/metrics/ 以Prometheus文本格式输出；超过查询数或耗时预算的请求记录慢请求日志。
+SQL统计通过在每个数据库连接上注册执行包装器实现，按上下文变量归属到当前请求，同步和异步视图均适用。
+多进程部署时每个进程各自统计，由Prometheus分别抓取后汇总。
+"""
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+METRICS = {
+    'app_request_duration_seconds': ("请求耗时（秒）", LATENCY_BUCKETS),
+    'app_request_db_queries': ("每个请求执行的SQL查询数", QUERY_BUCKETS),
+    'app_request_db_duration_seconds': ("每个请求的数据库耗时（秒）", LATENCY_BUCKETS),
+}
+
+# 当前请求的SQL统计，未在请求中（如后台工作进程）时为None
+current_stats = ContextVar('request_db_stats', default=None)
+
+
+class QueryStats:
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+
+def record_query(execute, sql, params, many, context):
+    """数据库连接的执行包装器，把查询数和耗时计入当前请求"""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.duration += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created 信号处理：为新建的数据库连接注册执行包装器（持久连接重连时不重复注册）"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # 最后一个计数对应 +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """按指标名和标签保存直方图"""
+    def __init__(self):
+        self.histograms = {name: {} for name in METRICS}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, values):
+        """labels 为 (视图名, 请求方法)，values 为 {指标名: 观测值}"""
+        with self.lock:
+            for name, value in values.items():
+                series = self.histograms[name]
+                if labels not in series:
+                    series[labels] = Histogram(METRICS[name][1])
+                series[labels].observe(value)
+
+    def clear(self):
+        with self.lock:
+            for series in self.histograms.values():
+                series.clear()
+
+    def render(self):
+        """以Prometheus文本格式输出全部直方图"""
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets) in METRICS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (view, method), histogram in sorted(self.histograms[name].items()):
+                    labels = f'view="{escape_label(view)}",method="{escape_label(method)}"'
+                    cumulative = 0
+                    for bound, count in zip([*buckets, '+Inf'], histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """记录每个请求的耗时、SQL查询数和数据库耗时，并对超出预算的请求记录慢请求日志"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.finish(request, response, stats, start)
+        return response
+
+    def begin(self):
+        stats = QueryStats()
+        return stats, current_stats.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match is not None and match.view_name else 'unmatched'
+        if view == 'metrics':
+            return
+        request_metrics.observe((view, request.method), {
+            'app_request_duration_seconds': duration,
+            'app_request_db_queries': stats.queries,
+            'app_request_db_duration_seconds': stats.duration,
+        })
+        if duration > settings.SLOW_REQUEST_SECONDS or stats.queries > settings.SLOW_REQUEST_QUERIES:
+            logger.warning(
+                f"慢请求 {request.method} {request.get_full_path()} ({view}) 状态码 {response.status_code}，"
+                f"耗时 {duration * 1000:.1f}ms，SQL查询 {stats.queries} 条，数据库耗时 {stats.duration * 1000:.1f}ms。"
+            )
+
+
+def metrics_view(request):
+    """Prometheus抓取接口"""
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
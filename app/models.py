@@ -6,6 +6,8 @@ class Process(models.Model):
 
 class RouteProcess(models.Model):
     """工序路线中间表，用于存储工序在工艺路线中的顺序"""
+    # 插入或移动工序时新顺序值之间的间隔，使大多数编辑只需修改一行
+    ORDER_GAP = 1024
     route = models.ForeignKey('Route', on_delete=models.CASCADE, verbose_name="工艺路线")
     process = models.ForeignKey('Process', on_delete=models.CASCADE, verbose_name="工序")
     order = models.IntegerField(default=0, verbose_name="工序顺序")
@@ -38,6 +40,13 @@ class WorkOrder(models.Model):
     # 一个工单对应一条工艺路线
     route = models.OneToOneField(Route, on_delete=models.CASCADE, verbose_name="工艺路线")
 
+    class Meta:
+        indexes = [
+            # 支持按状态、排产标记筛选工单
+            models.Index(fields=['status', 'is_scheduled'], name='workorder_status_sched_idx'),
+            models.Index(fields=['is_scheduled'], name='workorder_scheduled_idx'),
+        ]
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('pending', '未生产'),
@@ -56,3 +65,72 @@ class Task(models.Model):
         blank=True, 
         verbose_name="关联工艺路线工序关系"
     )
+    # 前置工序已全部完成、可以开工，由 app.progress 随任务状态变化维护
+    is_ready = models.BooleanField(default=False, editable=False, verbose_name="可开工")
+
+    class Meta:
+        indexes = [
+            # 支持按工单、工序筛选任务，并可同时按状态筛选
+            models.Index(fields=['work_order', 'status'], name='task_workorder_status_idx'),
+            models.Index(fields=['process', 'status'], name='task_process_status_idx'),
+            # 各工序的可开工队列，只索引可开工的任务，与历史任务的数量无关
+            models.Index(
+                fields=['process', 'id'], condition=models.Q(is_ready=True), name='task_process_ready_idx'
+            ),
+        ]
+        constraints = [
+            # 每个工单在工艺路线的每道工序上只有一个任务
+            models.UniqueConstraint(fields=['work_order', 'route_process'], name='unique_task_workorder_route_process'),
+        ]
+
+
+class WorkOrderProgress(models.Model):
+    """工单进度汇总：各状态的任务数和当前工序序号，随任务的增删改在同一事务中增量维护"""
+    work_order = models.OneToOneField(
+        WorkOrder, on_delete=models.CASCADE, primary_key=True, related_name="progress", verbose_name="关联工单"
+    )
+    pending_count = models.IntegerField(default=0, verbose_name="未生产任务数")
+    unreported_count = models.IntegerField(default=0, verbose_name="未报工任务数")
+    in_progress_count = models.IntegerField(default=0, verbose_name="进行中任务数")
+    completed_count = models.IntegerField(default=0, verbose_name="已完成任务数")
+    # 按工艺路线顺序第一个未完成任务的序号（从0开始），没有任务或全部完成时为空
+    active_step = models.IntegerField(null=True, blank=True, verbose_name="当前工序序号")
+
+    @property
+    def task_count(self):
+        return self.pending_count + self.unreported_count + self.in_progress_count + self.completed_count
+
+
+class SplitJob(models.Model):
+    """工单拆分任务队列，由后台工作进程依次处理"""
+    STATUS_CHOICES = [
+        ('queued', '排队中'),
+        ('running', '拆分中'),
+        ('succeeded', '已完成'),
+        ('failed', '失败'),
+    ]
+    # 排队中或拆分中的任务，同一工单的重复拆分请求会合并到该任务
+    ACTIVE_STATUSES = ['queued', 'running']
+    work_order = models.ForeignKey(WorkOrder, on_delete=models.CASCADE, related_name="split_jobs", verbose_name="关联工单")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="状态")
+    created_count = models.IntegerField(default=0, verbose_name="新建任务数")
+    kept_count = models.IntegerField(default=0, verbose_name="保留任务数")
+    removed_count = models.IntegerField(default=0, verbose_name="删除任务数")
+    error = models.TextField(blank=True, verbose_name="错误信息")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="开始时间")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完成时间")
+
+    class Meta:
+        indexes = [
+            # 工作进程按状态和ID领取排队中的任务
+            models.Index(fields=['status', 'id'], name='splitjob_status_idx'),
+        ]
+        constraints = [
+            # 每个工单同时只能有一个排队中或拆分中的任务
+            models.UniqueConstraint(
+                fields=['work_order'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_split_job',
+            ),
+        ]
@@ -0,0 +1,125 @@
+"""按需的请求级性能分析
+
+管理员（is_staff）请求携带 X-Profile 请求头，或开启 PROFILER_ALWAYS 后管理员的每个请求，
+在cProfile下执行，并记录每条SQL语句及其耗时。结果写入 PROFILER_DIR：
+  <ID>.prof     pstats格式，可用 snakeviz、flameprof、gprof2dot 等工具查看或生成火焰图
+  <ID>.sql.json 请求信息和SQL语句列表
+目录中只保留最近 PROFILER_MAX_FILES 次请求的结果，响应头 X-Profile-Id 返回本次结果的ID。
+
+WSGI和ASGI入口共用该中间件。cProfile只统计当前线程，ASGI下被分析的请求整体切换到
+一个同步线程中执行，下游的同步视图和异步视图中的ORM调用都会回到该线程，因此都能被统计到。
+"""
+import cProfile
+import json
+import logging
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 当前被分析请求的SQL记录列表，未分析时为None
+current_trace = ContextVar('request_sql_trace', default=None)
+
+
+def trace_query(execute, sql, params, many, context):
+    """数据库连接的执行包装器，为被分析的请求记录SQL语句和耗时"""
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.append({
+            'sql': sql,
+            'params': None if many else [str(param) for param in params or ()],
+            'many': many,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 3),
+        })
+
+
+def install_query_tracer(sender, connection, **kwargs):
+    """connection_created 信号处理：为新建的数据库连接注册SQL记录包装器"""
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_query)
+
+
+def wants_profile(request):
+    return settings.PROFILER_ALWAYS or settings.PROFILER_HEADER in request.META
+
+
+class ProfilerMiddleware:
+    """为管理员的请求按需开启cProfile和SQL记录，需放在AuthenticationMiddleware之后"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # 只有请求分析时才读取用户，避免普通请求查询会话
+        if not (wants_profile(request) and request.user.is_staff):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not wants_profile(request):
+            return await self.get_response(request)
+        user = await request.auser()
+        if not user.is_staff:
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        trace = []
+        token = current_trace.set(trace)
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+            current_trace.reset(token)
+        duration = time.perf_counter() - start
+
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{request.method.lower()}-{uuid.uuid4().hex[:8]}"
+        try:
+            self.save(profile_id, profiler, {
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+                'query_count': len(trace),
+                'query_duration_ms': round(sum(query['duration_ms'] for query in trace), 3),
+                'queries': trace,
+            })
+        except OSError as e:
+            logger.error(f"保存性能分析结果失败: {str(e)}")
+            return response
+        response['X-Profile-Id'] = profile_id
+        logger.info(f"已记录 {request.method} {request.get_full_path()} 的性能分析结果 {profile_id}。")
+        return response
+
+    def save(self, profile_id, profiler, summary):
+        directory = Path(settings.PROFILER_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(directory / f"{profile_id}.prof")
+        (directory / f"{profile_id}.sql.json").write_text(
+            json.dumps(summary, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+        # 按文件名（以时间开头）删除最早的结果，只保留最近 PROFILER_MAX_FILES 次
+        profiles = sorted(directory.glob('*.prof'))
+        for stale in profiles[:max(len(profiles) - settings.PROFILER_MAX_FILES, 0)]:
+            stale.unlink(missing_ok=True)
+            stale.with_suffix('.sql.json').unlink(missing_ok=True)
@@ -0,0 +1,112 @@
+"""工单进度汇总和可开工标记的增量维护
+
+任务的增删改（任务接口、批量报工、拆分工单、删除工序）在写入后调用 adjust_progress，
+在同一事务中按状态增减计数，重新定位当前工序并更新任务的可开工标记。
+缺少汇总记录的工单（如升级前的数据）从任务表重建。
+
+前置工序全部完成的任务只可能是按工艺路线顺序第一个未完成的任务，
+因此每个工单至多一个任务可开工：该任务为未生产或未报工状态时标记为可开工。
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+
+from .models import Task, WorkOrder, WorkOrderProgress
+
+COUNT_FIELDS = {status: f'{status}_count' for status, _ in Task.STATUS_CHOICES}
+# 前置工序全部完成后可以开工的任务状态
+READY_STATUSES = ('pending', 'unreported')
+
+
+def task_deltas(removed=(), added=()):
+    """把删除前和写入后的 (工单ID, 状态) 汇总为 {工单ID: Counter({状态: 增减数量})}"""
+    deltas = defaultdict(Counter)
+    for work_order_id, task_status in removed:
+        deltas[work_order_id][task_status] -= 1
+    for work_order_id, task_status in added:
+        deltas[work_order_id][task_status] += 1
+    return deltas
+
+
+def active_steps(work_order_ids):
+    """定位各工单按工艺路线顺序第一个未完成的任务
+
+    返回 ({工单ID: 该任务的序号（从0开始）}, 可开工的任务ID列表)，没有任务或全部完成时序号为None。
+    """
+    steps = dict.fromkeys(work_order_ids)
+    ready_task_ids = []
+    positions = Counter()
+    rows = (
+        Task.objects.filter(work_order_id__in=work_order_ids, route_process__route_id=F('work_order__route_id'))
+        .order_by('work_order_id', 'route_process__order')
+        .values_list('work_order_id', 'id', 'status')
+    )
+    for work_order_id, task_id, task_status in rows:
+        if steps[work_order_id] is not None:
+            continue
+        if task_status != 'completed':
+            steps[work_order_id] = positions[work_order_id]
+            if task_status in READY_STATUSES:
+                ready_task_ids.append(task_id)
+        positions[work_order_id] += 1
+    return steps, ready_task_ids
+
+
+def mark_ready(work_order_ids, ready_task_ids):
+    """把工单中可开工的任务标记为ready_task_ids，其余任务取消标记"""
+    Task.objects.filter(work_order_id__in=work_order_ids, is_ready=True).exclude(id__in=ready_task_ids).update(
+        is_ready=False
+    )
+    Task.objects.filter(id__in=ready_task_ids, is_ready=False).update(is_ready=True)
+
+
+def adjust_progress(deltas):
+    """按任务状态的增减更新工单进度，需在写入任务的同一事务中、写入之后调用"""
+    # 增减相抵的工单同样需要重新定位：重新拆分时删除一个未生产任务、新增另一个，计数不变但当前工序可能变化
+    deltas = {
+        work_order_id: {task_status: count for task_status, count in counts.items() if count}
+        for work_order_id, counts in deltas.items()
+    }
+    if not deltas:
+        return
+    steps, ready_task_ids = active_steps(list(deltas))
+    mark_ready(list(deltas), ready_task_ids)
+
+    missing = []
+    for work_order_id, counts in deltas.items():
+        fields = {COUNT_FIELDS[task_status]: F(COUNT_FIELDS[task_status]) + count for task_status, count in counts.items()}
+        fields['active_step'] = steps[work_order_id]
+        if not WorkOrderProgress.objects.filter(work_order_id=work_order_id).update(**fields):
+            missing.append(work_order_id)
+    if missing:
+        rebuild_progress(missing)
+
+
+def rebuild_progress(work_order_ids):
+    """从任务表重新统计工单进度和可开工标记，已有的汇总记录会被覆盖"""
+    rows = {work_order_id: WorkOrderProgress(work_order_id=work_order_id) for work_order_id in work_order_ids}
+    counts = (
+        Task.objects.filter(work_order_id__in=work_order_ids)
+        .values_list('work_order_id', 'status')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    for work_order_id, task_status, count in counts:
+        setattr(rows[work_order_id], COUNT_FIELDS[task_status], count)
+    steps, ready_task_ids = active_steps(work_order_ids)
+    for work_order_id, step in steps.items():
+        rows[work_order_id].active_step = step
+    mark_ready(work_order_ids, ready_task_ids)
+    WorkOrderProgress.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=['work_order'],
+        update_fields=[*COUNT_FIELDS.values(), 'active_step'],
+    )
+
+
+def refresh_route_progress(route_id):
+    """工艺路线的工序顺序变化后，重新定位使用该工艺路线的工单的当前工序和可开工任务"""
+    work_order_ids = list(WorkOrder.objects.filter(route_id=route_id).values_list('id', flat=True))
+    if work_order_ids:
+        rebuild_progress(work_order_ids)
@@ -1,7 +1,52 @@
+from django.db import transaction
+from django.db.models import Count, Q
 from rest_framework import serializers
-from .models import Process, Route, WorkOrder, Task, RouteProcess
+from .cache import route_structures, touch_route
+from .models import Process, Route, WorkOrder, Task, RouteProcess, SplitJob, WorkOrderProgress
+from .progress import COUNT_FIELDS
 
-class ProcessSerializer(serializers.ModelSerializer):
+def bulk_reorder(route_processes, floor):
+    """批量写回工艺路线工序关系的新顺序
+    
+    先把顺序改为低于floor（该工艺路线中现有及目标顺序的最小值）的临时值，
+    再写入目标顺序，避免交换顺序时违反(route, order)唯一约束。
+    """
+    final_orders = [rp.order for rp in route_processes]
+    for index, rp in enumerate(route_processes):
+        rp.order = floor - index - 1
+    RouteProcess.objects.bulk_update(route_processes, ['order'])
+    for rp, order in zip(route_processes, final_orders):
+        rp.order = order
+    RouteProcess.objects.bulk_update(route_processes, ['order'])
+
+
+def order_key_between(prev_order, next_order):
+    """计算插入到两个相邻顺序之间的新顺序值，没有可用的间隔时返回None"""
+    gap = RouteProcess.ORDER_GAP
+    if prev_order is None and next_order is None:
+        return gap
+    if next_order is None:
+        return prev_order + gap
+    if prev_order is None:
+        prev_order = min(0, next_order - gap)
+    if next_order - prev_order > 1:
+        return (prev_order + next_order) // 2
+    return None
+
+class SelectableFieldsMixin:
+    """按 fields 只保留部分输出字段，按 expand 把关联字段替换为嵌套对象
+    
+    可展开的字段由 Meta.expandable_fields 声明：{字段: 嵌套序列化器类}。未保留的字段不会被读取。
+    """
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in expand:
+            self.fields[name] = self.Meta.expandable_fields[name](read_only=True)
+        if fields is not None:
+            for name in [name for name, field in self.fields.items() if not field.write_only and name not in fields]:
+                self.fields.pop(name)
+
+class ProcessSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Process
         fields = ['id', 'name', 'description']
@@ -15,13 +60,72 @@ class RouteProcessSerializer(serializers.ModelSerializer):
         fields = ['id', 'process', 'order']
         read_only_fields = ['id']
 
+def preload_processes(context, routes_data):
+    """一次性查询提交的所有工艺路线中引用的工序，存入序列化器上下文供ProcessLookupField使用"""
+    process_ids = set()
+    for route_data in routes_data:
+        relations = route_data.get('process_relations') if isinstance(route_data, dict) else None
+        if not isinstance(relations, list):
+            continue
+        for relation in relations:
+            try:
+                process_ids.add(int(relation['process']))
+            except (KeyError, TypeError, ValueError):
+                continue
+    context['process_lookup'] = Process.objects.in_bulk(process_ids)
+
+
+class ProcessLookupField(serializers.PrimaryKeyRelatedField):
+    """按主键解析工序，优先使用上下文中预先批量加载的工序，避免逐条查询"""
+    def to_internal_value(self, data):
+        lookup = self.context.get('process_lookup')
+        if lookup is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return lookup[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class RouteProcessCreateUpdateSerializer(serializers.ModelSerializer):
     """用于创建和更新工艺路线与工序关系的序列化器"""
+    process = ProcessLookupField(queryset=Process.objects.all())
+    
     class Meta:
         model = RouteProcess
         fields = ['process', 'order']
 
-class RouteSerializer(serializers.ModelSerializer):
+class RouteListSerializer(serializers.ListSerializer):
+    """批量创建工艺路线：一次校验所有工序，批量插入工艺路线和工序关系"""
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            preload_processes(self.context, data)
+        return super().to_internal_value(data)
+    
+    def create(self, validated_data):
+        relations_per_route = [route_data.pop('process_relations', []) for route_data in validated_data]
+        with transaction.atomic():
+            routes = Route.objects.bulk_create([Route(**route_data) for route_data in validated_data])
+            RouteProcess.objects.bulk_create([
+                RouteProcess(route=route, **relation_data)
+                for route, relations in zip(routes, relations_per_route)
+                for relation_data in relations
+            ])
+            # 批量创建不会触发模型信号，需要显式使缓存失效
+            touch_route(*[route.id for route in routes])
+        return routes
+
+class RouteSummarySerializer(serializers.ModelSerializer):
+    """展开工单的工艺路线时使用，不嵌套工序"""
+    class Meta:
+        model = Route
+        fields = ['id', 'name']
+
+class RouteSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     # 使用嵌套序列化器显示关联的工序及其顺序
     processes = RouteProcessSerializer(source='routeprocess_set', many=True, read_only=True)
     # 用于创建和更新的工序数据
@@ -31,62 +135,243 @@ class RouteSerializer(serializers.ModelSerializer):
         model = Route
         fields = ['id', 'name', 'processes', 'process_relations']
         read_only_fields = ['id']
+        list_serializer_class = RouteListSerializer
+    
+    def to_internal_value(self, data):
+        # 单独提交一条工艺路线时，同样一次性校验其引用的全部工序
+        if self.root is self and 'process_lookup' not in self.context:
+            preload_processes(self.context, [data])
+        return super().to_internal_value(data)
     
     def create(self, validated_data):
         # 获取工序关系数据
         process_relations_data = validated_data.pop('process_relations', [])
-        # 创建工艺路线
-        route = Route.objects.create(**validated_data)
-        # 创建工序关系
-        for relation_data in process_relations_data:
-            RouteProcess.objects.create(route=route, **relation_data)
+        with transaction.atomic():
+            # 创建工艺路线
+            route = Route.objects.create(**validated_data)
+            # 批量创建工序关系
+            RouteProcess.objects.bulk_create([
+                RouteProcess(route=route, **relation_data) for relation_data in process_relations_data
+            ])
+            touch_route(route.id)  # 批量创建工序关系不会触发模型信号
         return route
     
+    def validate_process_relations(self, value):
+        orders = [relation['order'] for relation in value]
+        if len(orders) != len(set(orders)):
+            raise serializers.ValidationError("同一工艺路线中的工序顺序不能重复。")
+        return value
+    
     def update(self, instance, validated_data):
         # 获取工序关系数据
         process_relations_data = validated_data.pop('process_relations', None)
-        # 更新工艺路线基本信息
-        instance.name = validated_data.get('name', instance.name)
-        instance.save()
-        
-        # 如果提供了工序关系数据，则更新
-        if process_relations_data is not None:
-            # 清除现有关系
-            instance.routeprocess_set.all().delete()
-            # 创建新的关系
-            for relation_data in process_relations_data:
-                RouteProcess.objects.create(route=instance, **relation_data)
+        with transaction.atomic():
+            # 更新工艺路线基本信息
+            instance.name = validated_data.get('name', instance.name)
+            instance.save()
+            
+            # 如果提供了工序关系数据，则与现有关系比对后批量更新，保留未变化的关系及其关联的任务
+            if process_relations_data is not None:
+                self.sync_process_relations(instance, process_relations_data)
+                touch_route(instance.id)  # 批量增删改工序关系不会触发模型信号
         
         return instance
+    
+    def sync_process_relations(self, route, process_relations_data):
+        """比对提交的工序关系与现有关系，分别批量删除、更新顺序和新增"""
+        existing = sorted(route.routeprocess_set.all(), key=lambda rp: rp.order)
+        
+        # 工序和顺序都相同的关系直接保留
+        unmatched_existing = {}
+        for rp in existing:
+            unmatched_existing[(rp.process_id, rp.order)] = rp
+        pending = []
+        for relation_data in process_relations_data:
+            key = (relation_data['process'].id, relation_data['order'])
+            if unmatched_existing.pop(key, None) is None:
+                pending.append(relation_data)
+        
+        # 工序相同但顺序变化的关系只更新顺序，保持任务与其的关联
+        by_process = {}
+        for rp in unmatched_existing.values():
+            by_process.setdefault(rp.process_id, []).append(rp)
+        to_update = []
+        to_create = []
+        for relation_data in pending:
+            candidates = by_process.get(relation_data['process'].id)
+            if candidates:
+                rp = candidates.pop(0)
+                rp.order = relation_data['order']
+                to_update.append(rp)
+            else:
+                to_create.append(RouteProcess(route=route, **relation_data))
+        to_delete = [rp.id for candidates in by_process.values() for rp in candidates]
+        
+        if to_delete:
+            RouteProcess.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            floor = min([rp.order for rp in existing] + [rp.order for rp in to_update])
+            bulk_reorder(to_update, floor)
+        if to_create:
+            RouteProcess.objects.bulk_create(to_create)
+
+class ValuesSerializer:
+    """列表和详情接口的只读快速序列化
+
+    用 .values_list() 只取出接口字段对应的列（关联对象的字段通过联表取出），逐行直接构造字典，
+    不实例化模型和序列化器字段，输出与对应的ModelSerializer完全一致。
+    子类通过 fields 按输出顺序声明 (输出字段, 查询路径)，由多列组合而成的字段声明为
+    (输出字段, (查询路径, ...), 组合函数)。expandable 声明可展开的字段 {字段: (关联路径, 嵌套序列化器类)}，
+    与ModelSerializer的 Meta.expandable_fields 对应；select() 返回只含部分字段或展开了关联字段的子类。
+    """
+    fields = ()
+    expandable = {}
+
+    @classmethod
+    def values(cls, queryset):
+        # 具名元组行同时支持按属性读取主键，供游标分页计算位置
+        return queryset.values_list(*cls.lookups, named=True)
+
+    @classmethod
+    def to_representation(cls, row):
+        if cls.plain:
+            return dict(zip(cls.names, row))
+        return {
+            name: row[index] if combine is None else combine(*[row[i] for i in index])
+            for name, index, combine in cls.plan
+        }
+
+    @classmethod
+    def serialize(cls, rows):
+        to_representation = cls.to_representation
+        return [to_representation(row) for row in rows]
+
+    @classmethod
+    def select(cls, fields=None, expand=()):
+        """返回只输出fields中的字段（为None时输出全部）并展开expand中关联字段的子类，只查询所需的列"""
+        if fields is None and not expand:
+            return cls
+        key = (None if fields is None else tuple(fields), tuple(expand))
+        selected = cls.selections.get(key)
+        if selected is None:
+            specs = []
+            for field in cls.fields:
+                name = field[0]
+                if fields is not None and name not in fields:
+                    continue
+                if name in expand:
+                    path, serializer_class = cls.expandable[name]
+                    nested = tuple(serializer_class.Meta.fields)
+                    field = (name, tuple(f'{path}__{attr}' for attr in nested), nested_builder(nested))
+                specs.append(field)
+            selected = cls.selections[key] = type(cls.__name__, (cls,), {'fields': tuple(specs)})
+        return selected
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.names = tuple(field[0] for field in cls.fields)
+        cls.selections = {}
+        # 游标分页按主键定位，总是取出id列
+        lookups = ['id']
+        cls.plan = []
+        for name, lookup, *combine in cls.fields:
+            indexes = []
+            for path in (lookup if combine else (lookup,)):
+                if path not in lookups:
+                    lookups.append(path)
+                indexes.append(lookups.index(path))
+            cls.plan.append((name, tuple(indexes), combine[0]) if combine else (name, indexes[0], None))
+        cls.lookups = tuple(lookups)
+        cls.plain = all(len(field) == 2 for field in cls.fields) and cls.lookups == tuple(field[1] for field in cls.fields)
+
+
+def nested_builder(names):
+    """展开的关联对象由联表取出的各列组合成字典"""
+    return lambda *values: dict(zip(names, values))
 
-class WorkOrderSerializer(serializers.ModelSerializer):
+
+def check_status_transition(current_status, new_status):
+    """检查工单状态能否从current_status变更为new_status，返回错误信息或None"""
+    # 草稿状态下，所有字段都可以修改，但状态只能改为已提交
+    if current_status == 'draft' and new_status != 'submitted':
+        return "请先提交工单。"
+    # 已经审核的工单，需要反审核后修改
+    if current_status == 'approved' and new_status == 'draft':
+        return "请先反审核。"
+    return None
+
+class WorkOrderSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     # 显示工艺路线详情
     route = serializers.PrimaryKeyRelatedField(queryset=Route.objects.all())
-    # 显示关联的任务数量
+    # 显示关联的任务数量和进度，均读取增量维护的进度汇总
     task_count = serializers.SerializerMethodField()
+    progress = serializers.SerializerMethodField()
+    
+    def get_progress_record(self, obj):
+        # 视图集查询集已联表取出进度汇总，尚无汇总记录的工单视为没有任务
+        progress = getattr(obj, 'progress', None)
+        return progress if progress is not None else WorkOrderProgress(work_order_id=obj.id)
     
     def get_task_count(self, obj):
-        return obj.tasks.count()
+        return self.get_progress_record(obj).task_count
+    
+    def get_progress(self, obj):
+        progress = self.get_progress_record(obj)
+        data = {task_status: getattr(progress, field) for task_status, field in COUNT_FIELDS.items()}
+        data['active_step'] = progress.active_step
+        return data
     
     def validate_status(self, value):
         # 工单状态变更验证
         instance = self.instance
         if instance:
-            # 草稿状态下，所有字段都可以修改，但状态只能改为已提交
-            if instance.status == 'draft' and value != 'submitted':
-                raise serializers.ValidationError("请先提交工单。")
-            # 已经审核的工单，需要反审核后修改
-            if instance.status == 'approved' and value == 'draft':
-                raise serializers.ValidationError("请先反审核。")
+            error = check_status_transition(instance.status, value)
+            if error:
+                raise serializers.ValidationError(error)
             
         return value
     
     class Meta:
         model = WorkOrder
-        fields = ['id', 'name', 'status', 'route', 'task_count']
-        read_only_fields = ['task_count']
+        fields = ['id', 'name', 'status', 'route', 'task_count', 'progress']
+        read_only_fields = ['task_count', 'progress']
+        expandable_fields = {'route': RouteSummarySerializer}
+
+
+def task_total(*counts):
+    # 尚无汇总记录的工单联表结果为空，视为没有任务
+    return sum(count or 0 for count in counts)
+
+
+def progress_summary(*values):
+    progress = {task_status: count or 0 for task_status, count in zip(COUNT_FIELDS, values)}
+    progress['active_step'] = values[-1]
+    return progress
+
+
+COUNT_LOOKUPS = tuple(f'progress__{field}' for field in COUNT_FIELDS.values())
+
+
+class WorkOrderValuesSerializer(ValuesSerializer):
+    """WorkOrderSerializer的快速只读版本，进度汇总通过联表取出"""
+    fields = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('status', 'status'),
+        ('route', 'route_id'),
+        ('task_count', COUNT_LOOKUPS, task_total),
+        ('progress', COUNT_LOOKUPS + ('progress__active_step',), progress_summary),
+    )
+    expandable = {'route': ('route', RouteSummarySerializer)}
+
+
+class WorkOrderSummarySerializer(serializers.ModelSerializer):
+    """展开任务的工单时使用的简要信息"""
+    class Meta:
+        model = WorkOrder
+        fields = ['id', 'name', 'status']
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     # 显示工单和工序详情
     work_order = serializers.PrimaryKeyRelatedField(queryset=WorkOrder.objects.all())
     process = serializers.PrimaryKeyRelatedField(queryset=Process.objects.all())
@@ -113,36 +398,92 @@ class TaskSerializer(serializers.ModelSerializer):
                     # 如果没有关联的RouteProcess，则跳过这个验证
                     return data
                 
-                # 获取同一工艺路线中的所有工序及其顺序
-                all_route_processes = work_order.route.routeprocess_set.all().order_by('order')
+                # 从进程内缓存读取工艺路线结构，找到当前任务的前置和后置工序
+                structure = route_structures.get(work_order.route_id)
+                position = structure.positions.get(current_route_process.id)
+                current_order = structure.orders[position] if position is not None else current_route_process.order
+                predecessor_ids, successor_ids = structure.split_at(current_order)
                 
-                # 找到当前任务在工艺路线中的位置
-                current_order = current_route_process.order
+                # 用一条聚合查询统计未完成的前置工序任务和非未生产的后置工序任务
+                counts = Task.objects.filter(work_order=work_order).aggregate(
+                    unfinished_predecessors=Count(
+                        'id', filter=Q(route_process_id__in=predecessor_ids) & ~Q(status='completed')
+                    ),
+                    started_successors=Count(
+                        'id', filter=Q(route_process_id__in=successor_ids) & ~Q(status='pending')
+                    ),
+                )
                 
                 # 检查所有前置工序是否已完成
-                for route_process in all_route_processes:
-                    if route_process.order < current_order:
-                        # 获取对应的任务
-                        task = Task.objects.filter(
-                            work_order=work_order,
-                            route_process=route_process
-                        ).first()
-                        if task and task.status != 'completed':
-                            raise serializers.ValidationError("只有当前置所有工序已完成时，才能修改该工序的状态。")
+                if counts['unfinished_predecessors']:
+                    raise serializers.ValidationError("只有当前置所有工序已完成时，才能修改该工序的状态。")
                 
                 # 检查所有后置工序是否为未生产状态
-                for route_process in all_route_processes:
-                    if route_process.order > current_order:
-                        # 获取对应的任务
-                        task = Task.objects.filter(
-                            work_order=work_order,
-                            route_process=route_process
-                        ).first()
-                        if task and task.status != 'pending':
-                            raise serializers.ValidationError("只有当后置所有工序为未生产状态时，才能修改该工序的状态。")
+                if counts['started_successors']:
+                    raise serializers.ValidationError("只有当后置所有工序为未生产状态时，才能修改该工序的状态。")
         
         return data
     
     class Meta:
         model = Task
-        fields = ['id', 'work_order', 'work_order_name', 'process', 'process_name', 'status']
\ No newline at end of file
+        fields = ['id', 'work_order', 'work_order_name', 'process', 'process_name', 'status', 'is_ready']
+        read_only_fields = ['is_ready']
+        expandable_fields = {'work_order': WorkOrderSummarySerializer, 'process': ProcessSerializer}
+
+
+class TaskValuesSerializer(ValuesSerializer):
+    """TaskSerializer的快速只读版本，工单和工序名称通过联表取出"""
+    fields = (
+        ('id', 'id'),
+        ('work_order', 'work_order_id'),
+        ('work_order_name', 'work_order__name'),
+        ('process', 'process_id'),
+        ('process_name', 'process__name'),
+        ('status', 'status'),
+        ('is_ready', 'is_ready'),
+    )
+    expandable = {'work_order': ('work_order', WorkOrderSummarySerializer), 'process': ('process', ProcessSerializer)}
+
+
+class TaskReportItemSerializer(serializers.Serializer):
+    """批量报工中的单条任务状态变更"""
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Task.STATUS_CHOICES)
+
+
+class TaskBatchReportSerializer(serializers.Serializer):
+    """批量报工请求，按顺序依次应用每条状态变更"""
+    items = serializers.ListField(child=TaskReportItemSerializer(), allow_empty=False, max_length=1000)
+
+
+class RouteStepMoveSerializer(serializers.Serializer):
+    """移动工艺路线中的工序，after为前一个工序关系ID，为空表示移到最前"""
+    after = serializers.IntegerField(required=False, allow_null=True, default=None)
+
+
+class RouteStepInsertSerializer(RouteStepMoveSerializer):
+    """在工艺路线中插入工序"""
+    process = serializers.PrimaryKeyRelatedField(queryset=Process.objects.all())
+
+
+class SplitJobSerializer(serializers.ModelSerializer):
+    """工单拆分任务的状态和结果"""
+    class Meta:
+        model = SplitJob
+        fields = [
+            'id', 'work_order', 'status', 'created_count', 'kept_count', 'removed_count', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class WorkOrderBatchTransitionSerializer(serializers.Serializer):
+    """批量变更工单状态，审核时可同时提交拆分"""
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=WorkOrder.STATUS_CHOICES)
+    split = serializers.BooleanField(default=False)
+    
+    def validate(self, data):
+        if data['split'] and data['status'] != 'approved':
+            raise serializers.ValidationError("只有审核工单时才能同时拆分。")
+        return data
@@ -0,0 +1,24 @@
+"""模型写入时更新缓存版本号
+
+批量创建/更新不会触发信号，相应代码路径中需要显式调用 touch_route。
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import touch_process, touch_route
+from .models import Process, Route, RouteProcess
+
+
+@receiver([post_save, post_delete], sender=Process)
+def process_changed(sender, instance, **kwargs):
+    touch_process(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Route)
+def route_changed(sender, instance, **kwargs):
+    touch_route(instance.id)
+
+
+@receiver([post_save, post_delete], sender=RouteProcess)
+def route_process_changed(sender, instance, **kwargs):
+    touch_route(instance.route_id)
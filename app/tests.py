@@ -1,7 +1,9 @@
-from django.test import TestCase
+from pathlib import Path
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import WorkOrder, Task, Process, Route, RouteProcess
+from .models import WorkOrder, Task, Process, Route, RouteProcess, WorkOrderProgress, SplitJob
 
 class WorkOrderAPITestCase(TestCase):
     def setUp(self):
@@ -256,17 +258,11 @@ class WorkOrderSplitTestCase(TestCase):
             
     def test_manual_split_work_order_with_exception(self):
         """测试通过WorkOrderSplitView手动拆分工单时的异常处理"""
-        # 由于在实际应用中，我们不能确定WorkOrderSplitView的URL是否已配置
-        # 我们可以直接测试WorkOrderSplitView类的实例方法
+        # 拆分请求只负责入队，拆分过程中的异常记录在拆分任务中
+        from .jobs import process_next_job
         
-        # 导入WorkOrderSplitView
-        from .views import WorkOrderSplitView
-        from django.http import HttpRequest
-        from django.test.client import RequestFactory
-        
-        # 创建请求工厂
-        factory = RequestFactory()
-        request = factory.post(f'/workorders/{self.work_order.id}/split/')
+        response = self.client.post(f"/api/workorders/{self.work_order.id}/split/")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
         
         # 使用mock.patch来模拟拆分工单过程中的异常
         import unittest.mock as mock
@@ -276,20 +272,107 @@ class WorkOrderSplitTestCase(TestCase):
             # 配置mock方法抛出异常
             mock_split.side_effect = Exception("模拟手动拆分工单失败")
             
-            # 创建WorkOrderSplitView实例
-            view = WorkOrderSplitView.as_view()
-            
-            # 直接调用视图方法进行测试
-            response = view(request, pk=self.work_order.id)
-            
-            # 验证返回的状态码为500
-            self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+            # 由工作进程领取并执行拆分任务
+            job = process_next_job()
             
-            # 验证返回的错误消息
-            self.assertEqual(response.data, {"error": "拆分工单失败，请联系管理员。"})
+            # 验证拆分任务失败并记录错误消息
+            self.assertEqual(job.status, "failed")
+            self.assertEqual(job.error, "拆分工单失败，请联系管理员。")
             
             # 验证mock方法被调用
             mock_split.assert_called_once()
+        
+        # 验证工单未被标记为已排产
+        self.work_order.refresh_from_db()
+        self.assertFalse(self.work_order.is_scheduled)
+        
+        response = self.client.get(f"/api/split-jobs/{response.json()['id']}/")
+        self.assertEqual(response.json()["status"], "failed")
+
+    def test_split_job_reads_route_from_database(self):
+        """测试工作进程执行拆分时从数据库读取工艺路线结构，不使用可能过期的进程内缓存"""
+        import unittest.mock as mock
+        from .cache import route_structures
+        from .jobs import process_next_job
+        
+        self.client.post(f"/api/workorders/{self.work_order.id}/split/")
+        with mock.patch.object(route_structures, 'get', side_effect=AssertionError("不应读取进程内缓存")):
+            job = process_next_job()
+        self.assertEqual(job.status, "succeeded")
+        self.assertEqual(
+            set(Task.objects.filter(work_order=self.work_order).values_list('route_process_id', flat=True)),
+            set(self.route.routeprocess_set.values_list('id', flat=True)),
+        )
+
+    def test_split_job_queue(self):
+        """测试拆分请求入队、重复请求合并、工作进程执行后可查询结果"""
+        from .jobs import process_next_job
+        
+        url = f"/api/workorders/{self.work_order.id}/split/"
+        first = self.client.post(url).json()
+        second = self.client.post(url).json()
+        self.assertEqual(first["status"], "queued")
+        self.assertFalse(first["coalesced"])
+        self.assertEqual(second["id"], first["id"])
+        self.assertTrue(second["coalesced"])
+        self.assertFalse(Task.objects.filter(work_order=self.work_order).exists())
+        
+        job = process_next_job()
+        self.assertEqual(job.id, first["id"])
+        self.assertIsNone(process_next_job())
+        
+        response = self.client.get(f"/api/split-jobs/{job.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["status"], "succeeded")
+        self.assertEqual(response.json()["created_count"], 2)
+        self.work_order.refresh_from_db()
+        self.assertTrue(self.work_order.is_scheduled)
+        self.assertEqual(Task.objects.filter(work_order=self.work_order).count(), 2)
+        
+        # 上一个任务完成后再次请求拆分会创建新的任务
+        third = self.client.post(url).json()
+        self.assertNotEqual(third["id"], first["id"])
+    
+    def test_split_rejects_unapproved_work_order(self):
+        """测试未审核的工单不能拆分"""
+        self.work_order.status = "submitted"
+        self.work_order.save()
+        response = self.client.post(f"/api/workorders/{self.work_order.id}/split/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post("/api/workorders/999999/split/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_split_work_order_diff(self):
+        """测试重复拆分时保留已有任务、删除多余任务、补建缺失任务"""
+        from .views import WorkOrderViewSet
+        result = WorkOrderViewSet().split_work_order(self.work_order)
+        self.assertEqual(result, {"created": 2, "kept": 0, "removed": 0})
+        
+        # 修改工艺路线：删除工序1，新增工序3
+        process3 = Process.objects.create(name="工序3", description="描述3")
+        RouteProcess.objects.filter(route=self.route, order=1).delete()
+        RouteProcess.objects.create(route=self.route, process=process3, order=3)
+        
+        result = WorkOrderViewSet().split_work_order(self.work_order)
+        self.assertEqual(result, {"created": 1, "kept": 1, "removed": 1})
+        processes = list(Task.objects.filter(work_order=self.work_order).order_by('id').values_list('process_id', flat=True))
+        self.assertEqual(processes, [self.process2.id, process3.id])
+
+    def test_split_work_order_constant_queries(self):
+        """测试拆分工单的查询数量与工艺路线长度无关"""
+        from .views import WorkOrderViewSet
+        route = Route.objects.create(name="长工艺路线")
+        RouteProcess.objects.bulk_create([
+            RouteProcess(route=route, process=self.process1 if i % 2 else self.process2, order=i)
+            for i in range(1, 201)
+        ])
+        work_order = WorkOrder.objects.create(name="长工单", status="approved", route=route)
+        WorkOrderProgress.objects.create(work_order=work_order)
+        # 查询工艺路线、查询现有任务、批量创建任务（SQLite按参数数量上限分为两批）、
+        # 定位当前工序、更新可开工标记（两条）、更新进度，以及事务保存点
+        with self.assertNumQueries(10):
+            result = WorkOrderViewSet().split_work_order(work_order)
+        self.assertEqual(result["created"], 200)
 
 class TaskStatusChangeTestCase(TestCase):
     def setUp(self):
@@ -377,4 +460,1302 @@ class TaskStatusChangeTestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         # 解码响应内容并检查错误消息
         content = response.content.decode('utf-8')
-        self.assertIn("只有当后置所有工序为未生产状态时，才能修改该工序的状态。", content)
\ No newline at end of file
+        self.assertIn("只有当后置所有工序为未生产状态时，才能修改该工序的状态。", content)
+    
+    def test_task_status_validation_constant_queries(self):
+        """测试任务状态变更校验的查询数量与工艺路线长度无关"""
+        from .serializers import TaskSerializer
+        route = Route.objects.create(name="长工艺路线")
+        route_processes = RouteProcess.objects.bulk_create([
+            RouteProcess(route=route, process=self.process1, order=i) for i in range(1, 201)
+        ])
+        work_order = WorkOrder.objects.create(name="长工单", status="approved", route=route, is_scheduled=True)
+        Task.objects.bulk_create([
+            Task(work_order=work_order, process=self.process1, route_process=rp,
+                 status="completed" if rp.order < 100 else "pending")
+            for rp in route_processes
+        ])
+        task = Task.objects.select_related('work_order', 'route_process').get(
+            work_order=work_order, route_process__order=100
+        )
+        # 首次校验时加载工艺路线结构，之后命中进程内缓存，只需一条聚合查询
+        with self.assertNumQueries(2):
+            serializer = TaskSerializer(task, data={"status": "in_progress"}, partial=True)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        with self.assertNumQueries(1):
+            serializer = TaskSerializer(task, data={"status": "in_progress"}, partial=True)
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+    
+    def test_change_first_task_status(self):
+        """测试第一道工序没有前置工序，后置工序均未生产时可以修改状态"""
+        data = {"status": "unreported"}
+        response = self.client.patch(f"{self.tasks_url}{self.task1.id}/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_route_edit_invalidates_route_structure(self):
+        """测试修改工艺路线后，任务状态校验使用新的工序顺序"""
+        self.task1.status = "completed"
+        self.task1.save()
+        # 先校验一次，使工艺路线结构进入缓存
+        response = self.client.patch(f"{self.tasks_url}{self.task3.id}/", {"status": "in_progress"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        # 把工序3移到最前后，工序3没有前置工序
+        self.route_process3.order = 0
+        self.route_process3.save()
+        self.task2.status = "pending"
+        self.task2.save()
+        Task.objects.filter(id=self.task1.id).update(status="pending")
+        response = self.client.patch(f"{self.tasks_url}{self.task3.id}/", {"status": "in_progress"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ListQueryCountTestCase(TestCase):
+    """列表接口的查询数量不随数据量增长"""
+    def setUp(self):
+        self.client = APIClient()
+        
+    def create_data(self, count):
+        # 创建count条工艺路线，每条包含两道工序，并为每条路线创建已拆分的工单
+        for i in range(count):
+            process1 = Process.objects.create(name=f"工序{i}-1")
+            process2 = Process.objects.create(name=f"工序{i}-2")
+            route = Route.objects.create(name=f"工艺路线{i}")
+            rp1 = RouteProcess.objects.create(route=route, process=process1, order=1)
+            rp2 = RouteProcess.objects.create(route=route, process=process2, order=2)
+            work_order = WorkOrder.objects.create(name=f"工单{i}", status="approved", route=route, is_scheduled=True)
+            Task.objects.create(work_order=work_order, process=process1, route_process=rp1)
+            Task.objects.create(work_order=work_order, process=process2, route_process=rp2)
+    
+    def assert_list_queries(self, url, num):
+        # 分别在少量和较多数据下请求列表接口，查询数量应保持不变
+        # 每次请求前清空缓存，统计的是未命中缓存时的查询数量
+        self.create_data(2)
+        cache.clear()
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.create_data(10)
+        cache.clear()
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_route_list_queries(self):
+        """工艺路线列表：路线 + 预取工序关系及工序"""
+        self.assert_list_queries("/api/routes/", 2)
+    
+    def test_work_order_list_queries(self):
+        """工单列表：工单及注解的任务数量"""
+        self.assert_list_queries("/api/workorders/", 1)
+    
+    def test_task_list_queries(self):
+        """任务列表：任务联表工单和工序"""
+        self.assert_list_queries("/api/tasks/", 1)
+
+
+class CursorPaginationTestCase(TestCase):
+    """列表接口使用游标分页"""
+    def setUp(self):
+        self.client = APIClient()
+        process = Process.objects.create(name="工序")
+        route = Route.objects.create(name="工艺路线")
+        work_order = WorkOrder.objects.create(name="工单", route=route)
+        Task.objects.bulk_create([Task(work_order=work_order, process=process) for _ in range(25)])
+        
+    def test_paginate_tasks(self):
+        """测试按游标翻页获取全部任务，且不执行COUNT查询"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        ids = []
+        url = "/api/tasks/?page_size=10"
+        with CaptureQueriesContext(connection) as ctx:
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                data = response.json()
+                self.assertNotIn("count", data)
+                ids.extend(task["id"] for task in data["results"])
+                url = data["next"]
+        self.assertEqual(ids, list(Task.objects.order_by('id').values_list('id', flat=True)))
+        self.assertFalse(any("COUNT(" in query["sql"].upper() for query in ctx.captured_queries))
+
+
+class ListFilterTestCase(TestCase):
+    """工单和任务列表的服务端筛选"""
+    def setUp(self):
+        self.client = APIClient()
+        self.process1 = Process.objects.create(name="工序1")
+        self.process2 = Process.objects.create(name="工序2")
+        self.route1 = Route.objects.create(name="工艺路线1")
+        self.route2 = Route.objects.create(name="工艺路线2")
+        self.work_order1 = WorkOrder.objects.create(name="工单1", status="approved", route=self.route1, is_scheduled=True)
+        self.work_order2 = WorkOrder.objects.create(name="工单2", status="draft", route=self.route2)
+        self.task1 = Task.objects.create(work_order=self.work_order1, process=self.process1, status="completed")
+        self.task2 = Task.objects.create(work_order=self.work_order1, process=self.process2, status="pending")
+        self.task3 = Task.objects.create(work_order=self.work_order2, process=self.process2, status="pending")
+    
+    def get_ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item["id"] for item in response.json()["results"]]
+    
+    def test_filter_tasks(self):
+        """测试按状态、工单、工序和排产标记筛选任务"""
+        self.assertEqual(self.get_ids("/api/tasks/?status=pending"), [self.task2.id, self.task3.id])
+        self.assertEqual(self.get_ids(f"/api/tasks/?work_order={self.work_order1.id}"), [self.task1.id, self.task2.id])
+        self.assertEqual(self.get_ids(f"/api/tasks/?process={self.process2.id}&status=pending"), [self.task2.id, self.task3.id])
+        self.assertEqual(self.get_ids("/api/tasks/?is_scheduled=false"), [self.task3.id])
+    
+    def test_filter_work_orders(self):
+        """测试按状态和排产标记筛选工单"""
+        self.assertEqual(self.get_ids("/api/workorders/?status=draft"), [self.work_order2.id])
+        self.assertEqual(self.get_ids("/api/workorders/?is_scheduled=true"), [self.work_order1.id])
+    
+    def test_invalid_filter(self):
+        """测试无效的筛选参数返回400"""
+        response = self.client.get("/api/tasks/?status=unknown")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/workorders/?is_scheduled=maybe")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # 超出数据库整数范围的主键
+        for url in ("/api/tasks/?work_order=99999999999999999999999", "/api/workorders/?route=-1",
+                    "/api/async/tasks/?after=99999999999999999999999"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+
+
+class TaskBatchReportTestCase(TestCase):
+    """批量报工接口"""
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/tasks/batch-report/"
+        self.process = Process.objects.create(name="工序")
+        self.work_orders = []
+        self.tasks = []
+        for i in range(2):
+            route = Route.objects.create(name=f"工艺路线{i}")
+            route_processes = [
+                RouteProcess.objects.create(route=route, process=self.process, order=order) for order in (1, 2, 3)
+            ]
+            work_order = WorkOrder.objects.create(name=f"工单{i}", status="approved", route=route, is_scheduled=True)
+            self.work_orders.append(work_order)
+            self.tasks.append([
+                Task.objects.create(work_order=work_order, process=self.process, route_process=rp)
+                for rp in route_processes
+            ])
+    
+    def test_batch_report(self):
+        """测试批量报工按顺序校验，并返回每条变更的结果"""
+        first, second = self.tasks
+        data = {"items": [
+            {"id": first[0].id, "status": "completed"},
+            {"id": first[1].id, "status": "in_progress"},   # 前置工序在本批次中已完成
+            {"id": second[1].id, "status": "in_progress"},  # 前置工序未完成
+            {"id": second[0].id, "status": "unreported"},
+            {"id": 999999, "status": "completed"},
+        ]}
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual(body["updated"], 3)
+        self.assertEqual([r["success"] for r in body["results"]], [True, True, False, True, False])
+        self.assertEqual(body["results"][2]["error"], "只有当前置所有工序已完成时，才能修改该工序的状态。")
+        self.assertEqual(body["results"][4]["error"], "任务不存在。")
+        
+        statuses = dict(Task.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[first[0].id], "completed")
+        self.assertEqual(statuses[first[1].id], "in_progress")
+        self.assertEqual(statuses[second[1].id], "pending")
+        self.assertEqual(statuses[second[0].id], "unreported")
+    
+    def test_batch_report_rejects_successor_started(self):
+        """测试后置工序不是未生产状态时拒绝变更"""
+        first = self.tasks[0]
+        Task.objects.filter(id=first[2].id).update(status="in_progress")
+        response = self.client.post(self.url, {"items": [{"id": first[0].id, "status": "unreported"}]}, format="json")
+        self.assertEqual(response.json()["results"][0]["error"], "只有当后置所有工序为未生产状态时，才能修改该工序的状态。")
+    
+    def test_batch_report_invalid_payload(self):
+        """测试请求格式错误时返回400"""
+        response = self.client.post(self.url, {"items": [{"id": self.tasks[0][0].id, "status": "unknown"}]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RouteUpdateTestCase(TestCase):
+    """工艺路线更新时比对工序关系，保留未变化的关系"""
+    def setUp(self):
+        self.client = APIClient()
+        self.processes = [Process.objects.create(name=f"工序{i}") for i in range(4)]
+        self.route = Route.objects.create(name="工艺路线")
+        self.route_processes = [
+            RouteProcess.objects.create(route=self.route, process=process, order=i + 1)
+            for i, process in enumerate(self.processes[:3])
+        ]
+        self.work_order = WorkOrder.objects.create(name="工单", status="approved", route=self.route, is_scheduled=True)
+        from .views import WorkOrderViewSet
+        WorkOrderViewSet().split_work_order(self.work_order)
+    
+    def test_update_keeps_task_linkage(self):
+        """测试交换顺序、删除和新增工序后，未删除工序的任务仍关联原关系"""
+        rp0, rp1, rp2 = self.route_processes
+        data = {"process_relations": [
+            {"process": self.processes[1].id, "order": 1},  # 与工序0交换顺序
+            {"process": self.processes[0].id, "order": 2},
+            {"process": self.processes[3].id, "order": 3},  # 替换工序2
+        ]}
+        response = self.client.patch(f"/api/routes/{self.route.id}/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["process"]["id"], item["order"]) for item in response.json()["processes"]],
+            [(self.processes[1].id, 1), (self.processes[0].id, 2), (self.processes[3].id, 3)],
+        )
+        
+        # 工序0和工序1的关系被保留，只更新了顺序
+        self.assertEqual(RouteProcess.objects.get(id=rp0.id).order, 2)
+        self.assertEqual(RouteProcess.objects.get(id=rp1.id).order, 1)
+        self.assertFalse(RouteProcess.objects.filter(id=rp2.id).exists())
+        linked = set(Task.objects.filter(work_order=self.work_order).values_list('route_process_id', flat=True))
+        self.assertEqual(linked, {rp0.id, rp1.id, None})
+    
+    def test_update_rejects_duplicate_order(self):
+        """测试提交重复的工序顺序时返回400"""
+        data = {"process_relations": [
+            {"process": self.processes[0].id, "order": 1},
+            {"process": self.processes[1].id, "order": 1},
+        ]}
+        response = self.client.patch(f"/api/routes/{self.route.id}/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RouteStepTestCase(TestCase):
+    """工艺路线单步插入、移动和删除工序"""
+    def setUp(self):
+        self.client = APIClient()
+        self.processes = [Process.objects.create(name=f"工序{i}") for i in range(3)]
+        self.route = Route.objects.create(name="工艺路线")
+        self.steps_url = f"/api/routes/{self.route.id}/steps/"
+    
+    def ordered_processes(self):
+        return list(self.route.routeprocess_set.order_by('order').values_list('process_id', flat=True))
+    
+    def test_insert_move_remove_step(self):
+        """测试插入、移动、删除工序后的顺序"""
+        first = self.client.post(self.steps_url, {"process": self.processes[0].id}, format="json").json()
+        third = self.client.post(self.steps_url, {"process": self.processes[2].id, "after": first["id"]}, format="json").json()
+        response = self.client.post(self.steps_url, {"process": self.processes[1].id, "after": first["id"]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        second = response.json()
+        self.assertEqual(self.ordered_processes(), [p.id for p in self.processes])
+        
+        # 把第三道工序移到最前
+        response = self.client.post(f"{self.steps_url}{third['id']}/move/", {"after": None}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.ordered_processes(), [self.processes[2].id, self.processes[0].id, self.processes[1].id])
+        
+        response = self.client.delete(f"{self.steps_url}{second['id']}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.ordered_processes(), [self.processes[2].id, self.processes[0].id])
+    
+    def test_insert_touches_single_row(self):
+        """测试在长工艺路线中间插入工序的查询数量与路线长度无关"""
+        RouteProcess.objects.bulk_create([
+            RouteProcess(route=self.route, process=self.processes[0], order=(i + 1) * RouteProcess.ORDER_GAP)
+            for i in range(200)
+        ])
+        after = self.route.routeprocess_set.get(order=100 * RouteProcess.ORDER_GAP)
+        # 锁定工艺路线、校验工序、查询前后顺序、插入、查询使用该工艺路线的工单，以及事务保存点
+        with self.assertNumQueries(8):
+            response = self.client.post(self.steps_url, {"process": self.processes[1].id, "after": after.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()["order"], 100 * RouteProcess.ORDER_GAP + RouteProcess.ORDER_GAP // 2)
+    
+    def test_renumber_when_gap_exhausted(self):
+        """测试相邻顺序之间没有间隔时自动重新编号"""
+        rp1 = RouteProcess.objects.create(route=self.route, process=self.processes[0], order=1)
+        RouteProcess.objects.create(route=self.route, process=self.processes[1], order=2)
+        response = self.client.post(self.steps_url, {"process": self.processes[2].id, "after": rp1.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.ordered_processes(), [self.processes[0].id, self.processes[2].id, self.processes[1].id])
+        self.assertEqual(
+            list(self.route.routeprocess_set.order_by('order').values_list('order', flat=True)),
+            [RouteProcess.ORDER_GAP, RouteProcess.ORDER_GAP * 3 // 2, RouteProcess.ORDER_GAP * 2],
+        )
+    
+    def test_after_step_from_other_route(self):
+        """测试指定其他工艺路线的工序作为前一道工序时返回400"""
+        other = Route.objects.create(name="其他工艺路线")
+        rp = RouteProcess.objects.create(route=other, process=self.processes[0], order=1)
+        response = self.client.post(self.steps_url, {"process": self.processes[1].id, "after": rp.id}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RouteBulkCreateTestCase(TestCase):
+    """批量创建工艺路线"""
+    def setUp(self):
+        self.client = APIClient()
+        self.processes = [Process.objects.create(name=f"工序{i}") for i in range(5)]
+    
+    def route_data(self, name, count):
+        return {
+            "name": name,
+            "process_relations": [{"process": self.processes[i % 5].id, "order": i + 1} for i in range(count)],
+        }
+    
+    def test_create_single_route_bulk_relations(self):
+        """测试创建单条工艺路线时一次校验工序并批量插入工序关系"""
+        # 校验工序、插入工艺路线、批量插入工序关系、查询返回结果，以及事务保存点
+        with self.assertNumQueries(7):
+            response = self.client.post("/api/routes/", self.route_data("工艺路线", 50), format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()["processes"]), 50)
+    
+    def test_create_routes_in_batch(self):
+        """测试提交数组时批量创建多条工艺路线"""
+        data = [self.route_data(f"工艺路线{i}", 10) for i in range(20)]
+        # 校验工序、批量插入工艺路线和工序关系、查询返回结果，以及事务保存点
+        with self.assertNumQueries(7):
+            response = self.client.post("/api/routes/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([route["name"] for route in response.json()], [f"工艺路线{i}" for i in range(20)])
+        self.assertEqual(RouteProcess.objects.count(), 200)
+    
+    def test_create_routes_with_unknown_process(self):
+        """测试批量创建时引用不存在的工序会整体失败"""
+        data = [self.route_data("工艺路线1", 2), {"name": "工艺路线2", "process_relations": [{"process": 999999, "order": 1}]}]
+        response = self.client.post("/api/routes/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Route.objects.exists())
+
+
+class StreamingExportTestCase(TestCase):
+    """任务和工单的流式导出"""
+    def setUp(self):
+        self.client = APIClient()
+        process = Process.objects.create(name="工序")
+        route = Route.objects.create(name="工艺路线")
+        self.work_order = WorkOrder.objects.create(name="工单,1", route=route)
+        Task.objects.bulk_create([Task(work_order=self.work_order, process=process) for _ in range(5)])
+        # 直接写入的任务不会更新进度汇总
+        from .progress import rebuild_progress
+        rebuild_progress([self.work_order.id])
+    
+    def read(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode('utf-8')
+    
+    def test_export_tasks_ndjson(self):
+        """测试NDJSON导出与列表接口输出一致"""
+        import json
+        content = self.read(self.client.get("/api/tasks/export/"))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(rows, self.client.get("/api/tasks/").json()["results"])
+    
+    def test_export_work_orders_csv(self):
+        """测试CSV导出包含表头并正确转义"""
+        import csv
+        content = self.read(self.client.get("/api/workorders/export/?type=csv"))
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(rows[0], ['id', 'name', 'status', 'route', 'task_count', 'progress'])
+        self.assertEqual(rows[1], [
+            str(self.work_order.id), "工单,1", "draft", str(self.work_order.route_id), "5",
+            '{"pending":5,"unreported":0,"in_progress":0,"completed":0,"active_step":null}',
+        ])
+    
+    def test_export_with_filter(self):
+        """测试导出时同样应用筛选参数"""
+        content = self.read(self.client.get("/api/tasks/export/?status=completed"))
+        self.assertEqual(content, "")
+    
+    async def test_export_under_asgi_streams_async(self):
+        """测试ASGI下导出返回逐块读取的异步迭代器，内容与WSGI下一致"""
+        from unittest import mock
+        from asgiref.sync import sync_to_async
+        from django.test import AsyncClient
+        from .views import TaskViewSet
+        expected = await sync_to_async(lambda: self.read(self.client.get("/api/tasks/export/?type=csv")))()
+        with mock.patch.object(TaskViewSet, 'export_chunk_size', 2):
+            response = await AsyncClient().get("/api/tasks/export/?type=csv")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        # 表头和5行数据按每块2行发送
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(b"".join(chunks).decode('utf-8'), expected)
+    
+    def test_export_invalid_type(self):
+        """测试不支持的导出格式返回400"""
+        response = self.client.get("/api/tasks/export/?type=xml")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ReadCacheTestCase(TestCase):
+    """工序和工艺路线读接口的响应缓存与条件请求"""
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.process = Process.objects.create(name="工序")
+        self.route = Route.objects.create(name="工艺路线")
+        RouteProcess.objects.create(route=self.route, process=self.process, order=1)
+        self.route_url = f"/api/routes/{self.route.id}/"
+    
+    def test_cached_read_and_not_modified(self):
+        """测试重复读取命中缓存，携带ETag时返回304"""
+        response = self.client.get(self.route_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+        
+        with self.assertNumQueries(0):
+            cached = self.client.get(self.route_url)
+        self.assertEqual(cached.status_code, status.HTTP_200_OK)
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached["ETag"], etag)
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.route_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_writes_within_same_second_change_etag(self):
+        """测试同一秒内的多次写入都会改变ETag，只携带If-Modified-Since时不返回304"""
+        from django.utils.http import http_date
+        import time
+        first = self.client.get(self.route_url)["ETag"]
+        self.client.patch(self.route_url, {"name": "名称1"}, format="json")
+        second = self.client.get(self.route_url)["ETag"]
+        self.client.patch(self.route_url, {"name": "名称2"}, format="json")
+        self.assertEqual(len({first, second, self.client.get(self.route_url)["ETag"]}), 3)
+        response = self.client.get(self.route_url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["name"], "名称2")
+    
+    def test_cache_keyed_by_host_and_scheme(self):
+        """测试不同主机或协议访问时不会读到包含其他主机分页链接的缓存"""
+        Process.objects.bulk_create([Process(name=f"工序{i}") for i in range(2)])
+        first = self.client.get("/api/processes/?page_size=1", HTTP_HOST="a.example.com")
+        other_host = self.client.get("/api/processes/?page_size=1", HTTP_HOST="b.example.com")
+        https = self.client.get("/api/processes/?page_size=1", HTTP_HOST="a.example.com", secure=True)
+        self.assertTrue(first.json()["next"].startswith("http://a.example.com/"))
+        self.assertTrue(other_host.json()["next"].startswith("http://b.example.com/"))
+        self.assertTrue(https.json()["next"].startswith("https://a.example.com/"))
+        self.assertEqual(len({first["ETag"], other_host["ETag"], https["ETag"]}), 3)
+    
+    def test_route_write_invalidates(self):
+        """测试通过接口修改工艺路线后缓存失效"""
+        etag = self.client.get(self.route_url)["ETag"]
+        list_etag = self.client.get("/api/routes/")["ETag"]
+        self.client.patch(self.route_url, {"name": "新名称"}, format="json")
+        
+        response = self.client.get(self.route_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["name"], "新名称")
+        response = self.client.get("/api/routes/", HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_process_write_invalidates_routes(self):
+        """测试修改工序后，嵌套该工序的工艺路线缓存同样失效"""
+        etag = self.client.get(self.route_url)["ETag"]
+        self.client.patch(f"/api/processes/{self.process.id}/", {"name": "新工序"}, format="json")
+        response = self.client.get(self.route_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["processes"][0]["process"]["name"], "新工序")
+    
+    def test_versions_shared_between_processes(self):
+        """测试其他进程更新的版本号同样使本进程缓存的工艺路线结构失效"""
+        from django.conf import settings
+        from django.core.cache.backends.filebased import FileBasedCache
+        from .cache import VERSION_KEY_PREFIX, route_structures
+        self.assertEqual(len(route_structures.get(self.route.id)), 1)
+        # 模拟另一个进程：绕过信号修改数据库，并通过独立的缓存实例更新版本号
+        RouteProcess.objects.bulk_create([RouteProcess(route=self.route, process=self.process, order=2)])
+        other_process_cache = FileBasedCache(settings.CACHES['default']['LOCATION'], {})
+        other_process_cache.set(VERSION_KEY_PREFIX + f"route:{self.route.id}", 10 ** 10, timeout=None)
+        self.assertEqual(len(route_structures.get(self.route.id)), 2)
+    
+    def test_local_memory_cache_bypasses_route_structures(self):
+        """测试使用进程内缓存时系统检查给出警告，工艺路线结构直接从数据库读取"""
+        from django.test import override_settings
+        from .cache import check_shared_cache, route_structures
+        self.assertEqual(check_shared_cache(None), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            self.assertEqual([warning.id for warning in check_shared_cache(None)], ['app.W001'])
+            self.assertEqual(len(route_structures.get(self.route.id)), 1)
+            RouteProcess.objects.bulk_create([RouteProcess(route=self.route, process=self.process, order=2)])
+            self.assertEqual(len(route_structures.get(self.route.id)), 2)
+
+
+class AsyncReadViewTestCase(TestCase):
+    """ASGI部署下的异步只读接口"""
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.process = Process.objects.create(name="工序")
+        self.route = Route.objects.create(name="工艺路线")
+        RouteProcess.objects.create(route=self.route, process=self.process, order=1)
+        self.work_order = WorkOrder.objects.create(name="工单", route=self.route, status="approved", is_scheduled=True)
+        Task.objects.bulk_create([Task(work_order=self.work_order, process=self.process) for _ in range(5)])
+    
+    def test_async_views_match_sync_views(self):
+        """测试异步接口与同步接口输出一致"""
+        for name in ("tasks", "workorders", "routes"):
+            sync_data = self.client.get(f"/api/{name}/").json()["results"]
+            async_data = self.client.get(f"/api/async/{name}/").json()["results"]
+            self.assertEqual(async_data, sync_data)
+            detail = self.client.get(f"/api/async/{name}/{sync_data[0]['id']}/")
+            self.assertEqual(detail.json(), sync_data[0])
+    
+    def test_async_task_pagination_and_filter(self):
+        """测试异步任务列表的翻页和筛选"""
+        ids = []
+        url = "/api/async/tasks/?page_size=2&status=pending"
+        while url:
+            data = self.client.get(url).json()
+            ids.extend(task["id"] for task in data["results"])
+            url = data["next"]
+        self.assertEqual(ids, list(Task.objects.order_by('id').values_list('id', flat=True)))
+        
+        response = self.client.get("/api/async/tasks/?status=unknown")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get("/api/async/tasks/999999/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        for url in ("/api/async/tasks/?page_size=0", "/api/async/routes/?page_size=-1"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertEqual(response.json(), {"error": "无效的分页参数。"})
+    
+    def test_async_records_encoded_like_sync_views(self):
+        """测试异步接口的记录与同步接口使用相同的JSON编码"""
+        import json
+        sync_rows = json.loads(self.client.get("/api/tasks/").content)["results"]
+        content = self.client.get("/api/async/tasks/").content
+        self.assertIn(json.dumps(sync_rows, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), content)
+
+
+class SQLiteProfileTestCase(SimpleTestCase):
+    """SQLite生产配置下读写并发互不阻塞"""
+    def setUp(self):
+        import tempfile
+        from django.db import connection
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.settings_dict = {**connection.settings_dict, 'NAME': f"{self.tmpdir.name}/concurrency.sqlite3"}
+        if connection.vendor != 'sqlite':
+            self.skipTest("仅适用于SQLite")
+        conn = self.connect()
+        conn.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, value INTEGER)")
+    
+    def connect(self):
+        # 使用与默认数据库相同的配置（包括PRAGMA）打开一个新的文件数据库连接
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        wrapper = DatabaseWrapper(dict(self.settings_dict), alias='concurrency')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.connection.close)
+        return wrapper.connection
+    
+    def test_pragmas_applied(self):
+        """测试新连接启用了WAL和相关PRAGMA"""
+        conn = self.connect()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        self.assertGreater(conn.execute("PRAGMA busy_timeout").fetchone()[0], 0)
+    
+    def test_reader_does_not_block_writer(self):
+        """测试读事务进行中时写入可以立即提交，读事务仍读取一致的快照"""
+        reader = self.connect()
+        writer = self.connect()
+        reader.execute("BEGIN")
+        self.assertEqual(reader.execute("SELECT COUNT(*) FROM item").fetchone()[0], 0)
+        
+        writer.execute("PRAGMA busy_timeout=0")  # 不等待锁，被阻塞时立即报错
+        writer.execute("INSERT INTO item (value) VALUES (1)")
+        self.assertEqual(reader.execute("SELECT COUNT(*) FROM item").fetchone()[0], 0)
+        reader.execute("COMMIT")
+        self.assertEqual(reader.execute("SELECT COUNT(*) FROM item").fetchone()[0], 1)
+    
+    def test_parallel_writers_wait_for_lock(self):
+        """测试并发写事务等待锁而不是报错，并且写入期间读取不被阻塞"""
+        import threading
+        import time
+        errors = []
+        
+        def write(value):
+            try:
+                conn = self.connect()
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("INSERT INTO item (value) VALUES (?)", (value,))
+                time.sleep(0.1)
+                conn.execute("COMMIT")
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        reader = self.connect()
+        reader.execute("PRAGMA busy_timeout=0")
+        started = time.monotonic()
+        while any(thread.is_alive() for thread in threads):
+            reader.execute("SELECT COUNT(*) FROM item").fetchone()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(reader.execute("SELECT COUNT(*) FROM item").fetchone()[0], 4)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)  # 写事务依次执行
+
+
+class DatabaseConfigTestCase(SimpleTestCase):
+    """根据环境变量生成数据库配置"""
+    def test_default_sqlite(self):
+        """测试未设置数据库引擎时使用带持久连接的SQLite"""
+        from Process_Table.settings import build_database_config
+        config = build_database_config({})
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+    
+    def test_postgresql_with_pool(self):
+        """测试PostgreSQL启用连接池时关闭持久连接"""
+        from Process_Table.settings import build_database_config
+        config = build_database_config({
+            'DATABASE_ENGINE': 'django.db.backends.postgresql',
+            'DATABASE_NAME': 'process_table',
+            'DATABASE_HOST': 'db',
+            'DATABASE_PORT': '5432',
+            'DATABASE_POOL': 'True',
+            'DATABASE_POOL_MAX_SIZE': '20',
+        })
+        self.assertEqual((config['NAME'], config['HOST'], config['PORT']), ('process_table', 'db', '5432'))
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+    
+    def test_postgresql_persistent_connections(self):
+        """测试PostgreSQL未启用连接池时使用持久连接"""
+        from Process_Table.settings import build_database_config
+        config = build_database_config({
+            'DATABASE_ENGINE': 'django.db.backends.postgresql',
+            'DATABASE_CONN_MAX_AGE': '',
+            'DATABASE_CONN_HEALTH_CHECKS': 'False',
+        })
+        self.assertIsNone(config['CONN_MAX_AGE'])
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['OPTIONS'], {})
+
+
+class WorkOrderBatchTransitionTestCase(TestCase):
+    """批量变更工单状态"""
+    def setUp(self):
+        self.client = APIClient()
+        self.url = "/api/workorders/batch-transition/"
+        process = Process.objects.create(name="工序")
+        self.work_orders = []
+        for i in range(3):
+            route = Route.objects.create(name=f"工艺路线{i}")
+            RouteProcess.objects.create(route=route, process=process, order=1)
+            self.work_orders.append(WorkOrder.objects.create(name=f"工单{i}", route=route))
+    
+    def statuses(self):
+        return [WorkOrder.objects.get(id=work_order.id).status for work_order in self.work_orders]
+    
+    def test_batch_submit_and_approve(self):
+        """测试批量提交、审核，并按状态流转规则返回每个工单的结果"""
+        ids = [work_order.id for work_order in self.work_orders]
+        response = self.client.post(self.url, {"ids": ids[:2], "status": "submitted"}, format="json")
+        self.assertEqual(response.json()["updated"], 2)
+        
+        # 草稿状态的工单3不能直接审核
+        response = self.client.post(self.url, {"ids": ids + [999999], "status": "approved"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()["results"]
+        self.assertEqual([r["success"] for r in results], [True, True, False, False])
+        self.assertEqual(results[2]["error"], "请先提交工单。")
+        self.assertEqual(results[3]["error"], "工单不存在。")
+        self.assertEqual(self.statuses(), ["approved", "approved", "draft"])
+        
+        # 已审核的工单不能直接改为草稿
+        response = self.client.post(self.url, {"ids": ids[:1], "status": "draft"}, format="json")
+        self.assertEqual(response.json()["results"][0]["error"], "请先反审核。")
+    
+    def test_batch_approve_and_split(self):
+        """测试批量审核时同时提交拆分任务"""
+        from .jobs import process_next_job
+        ids = [work_order.id for work_order in self.work_orders]
+        WorkOrder.objects.filter(id__in=ids).update(status="submitted")
+        response = self.client.post(self.url, {"ids": ids, "status": "approved", "split": True}, format="json")
+        results = response.json()["results"]
+        self.assertTrue(all("split_job" in r and not r["coalesced"] for r in results))
+        
+        while process_next_job():
+            pass
+        self.assertEqual(Task.objects.count(), 3)
+        self.assertEqual(WorkOrder.objects.filter(is_scheduled=True).count(), 3)
+    
+    def test_split_requires_approve(self):
+        """测试只有审核时才能同时拆分"""
+        response = self.client.post(self.url, {"ids": [self.work_orders[0].id], "status": "submitted", "split": True}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SplitWorkerTestCase(TestCase):
+    """拆分工作进程的主循环"""
+    def setUp(self):
+        from unittest import mock
+        # 测试在事务中执行，不能关闭数据库连接
+        patcher = mock.patch('app.management.commands.run_split_workers.close_old_connections')
+        self.close_old_connections = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_errors_do_not_stop_worker(self):
+        """测试执行出错时记录日志并继续运行，每次循环前后关闭过期连接"""
+        from unittest import mock
+        from django.db import OperationalError
+        from app.management.commands.run_split_workers import SplitWorker
+        worker = SplitWorker(poll_interval=0, stale_after=600, requeue_interval=60)
+        with mock.patch(
+            'app.management.commands.run_split_workers.process_next_job', side_effect=OperationalError("database is locked")
+        ), self.assertLogs('app.management.commands.run_split_workers', 'ERROR'):
+            self.assertIsNone(worker.run_once())
+        self.assertEqual(self.close_old_connections.call_count, 2)
+        self.assertIsNone(worker.run_once())
+    
+    def test_requeue_stale_jobs_periodically(self):
+        """测试工作进程定期把超时的拆分中任务重新入队"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from app.management.commands.run_split_workers import SplitWorker
+        route = Route.objects.create(name="工艺路线")
+        work_order = WorkOrder.objects.create(name="工单", route=route, status="approved")
+        job = SplitJob.objects.create(work_order=work_order, status="running", started_at=timezone.now() - timedelta(hours=1))
+        worker = SplitWorker(poll_interval=0, stale_after=600, requeue_interval=60)
+        
+        # 未到检查间隔时不处理
+        self.assertIsNone(worker.run_once())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "running")
+        
+        worker.last_requeue -= 60
+        self.assertEqual(worker.run_once().id, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, "succeeded")
+
+class WorkOrderProgressTestCase(TestCase):
+    """工单进度汇总的增量维护"""
+    def setUp(self):
+        from .jobs import enqueue_split, process_next_job
+        self.client = APIClient()
+        self.processes = [Process.objects.create(name=f"工序{i}") for i in range(3)]
+        route = Route.objects.create(name="工艺路线")
+        for i, process in enumerate(self.processes):
+            RouteProcess.objects.create(route=route, process=process, order=i + 1)
+        response = self.client.post("/api/workorders/", {"name": "工单", "route": route.id}, format="json")
+        self.work_order = WorkOrder.objects.get(id=response.json()["id"])
+        WorkOrder.objects.filter(id=self.work_order.id).update(status="approved")
+        enqueue_split(self.work_order)
+        process_next_job()
+        self.tasks = list(Task.objects.filter(work_order=self.work_order).order_by('route_process__order'))
+    
+    def progress(self):
+        return self.client.get(f"/api/workorders/{self.work_order.id}/").json()["progress"]
+    
+    def assert_matches_tasks(self):
+        """增量维护的结果与从任务表重建的结果一致"""
+        from .progress import rebuild_progress
+        incremental = self.progress()
+        rebuild_progress([self.work_order.id])
+        self.assertEqual(incremental, self.progress())
+    
+    def test_split_and_report(self):
+        """测试拆分和报工后进度随之更新"""
+        self.assertEqual(self.progress(), {
+            "pending": 3, "unreported": 0, "in_progress": 0, "completed": 0, "active_step": 0,
+        })
+        self.client.post("/api/tasks/batch-report/", {"items": [
+            {"id": self.tasks[0].id, "status": "completed"},
+            {"id": self.tasks[1].id, "status": "in_progress"},
+        ]}, format="json")
+        self.assertEqual(self.progress(), {
+            "pending": 1, "unreported": 0, "in_progress": 1, "completed": 1, "active_step": 1,
+        })
+        self.assert_matches_tasks()
+    
+    def test_task_create_update_delete(self):
+        """测试单个任务的增删改更新进度"""
+        self.client.patch(f"/api/tasks/{self.tasks[0].id}/", {"status": "completed"}, format="json")
+        self.assertEqual(self.progress()["active_step"], 1)
+        self.client.delete(f"/api/tasks/{self.tasks[2].id}/")
+        self.client.post("/api/tasks/", {
+            "work_order": self.work_order.id, "process": self.processes[0].id, "status": "unreported",
+        }, format="json")
+        progress = self.progress()
+        self.assertEqual((progress["pending"], progress["unreported"], progress["completed"]), (1, 1, 1))
+        self.assert_matches_tasks()
+    
+    def test_delete_process(self):
+        """测试删除工序级联删除任务时更新进度"""
+        self.client.delete(f"/api/processes/{self.processes[1].id}/")
+        self.assertEqual(self.progress()["pending"], 2)
+        self.assert_matches_tasks()
+    
+    def test_resplit_after_route_edit(self):
+        """测试修改工艺路线后重新拆分，任务数不变时同样重新定位当前工序"""
+        from .jobs import enqueue_split, process_next_job
+        step_a, step_x, step_y = self.processes
+        route = Route.objects.create(name="两道工序")
+        RouteProcess.objects.create(route=route, process=step_a, order=1)
+        RouteProcess.objects.create(route=route, process=step_x, order=2)
+        work_order = WorkOrder.objects.create(name="重新拆分", route=route, status="approved")
+        enqueue_split(work_order)
+        process_next_job()
+        Task.objects.filter(work_order=work_order, process=step_a).update(status="completed")
+        from .progress import rebuild_progress
+        rebuild_progress([work_order.id])
+        
+        # [A已完成, X未生产] 改为 [Y, A]
+        response = self.client.patch(f"/api/routes/{route.id}/", {"process_relations": [
+            {"process": step_y.id, "order": 1}, {"process": step_a.id, "order": 2},
+        ]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        enqueue_split(work_order)
+        job = process_next_job()
+        self.assertEqual((job.created_count, job.kept_count, job.removed_count), (1, 1, 1))
+        
+        incremental = self.client.get(f"/api/workorders/{work_order.id}/").json()["progress"]
+        self.assertEqual(incremental["active_step"], 0)
+        self.assertTrue(Task.objects.get(work_order=work_order, process=step_y).is_ready)
+        rebuild_progress([work_order.id])
+        self.assertEqual(self.client.get(f"/api/workorders/{work_order.id}/").json()["progress"], incremental)
+    
+    def test_list_reads_progress_in_one_query(self):
+        """测试工单列表联表读取进度，不再逐行统计任务"""
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/workorders/")
+        self.assertEqual(response.json()["results"][0]["task_count"], 3)
+
+
+class ReadyTaskQueueTestCase(TestCase):
+    """各工序的可开工队列"""
+    def setUp(self):
+        from .jobs import enqueue_split, process_next_job
+        self.client = APIClient()
+        self.processes = [Process.objects.create(name=f"工序{i}") for i in range(3)]
+        self.work_orders = []
+        for i in range(2):
+            route = Route.objects.create(name=f"工艺路线{i}")
+            for order, process in enumerate(self.processes):
+                RouteProcess.objects.create(route=route, process=process, order=order + 1)
+            work_order = WorkOrder.objects.create(name=f"工单{i}", route=route, status="approved")
+            enqueue_split(work_order)
+            process_next_job()
+            self.work_orders.append(work_order)
+    
+    def ready(self, process):
+        response = self.client.get(f"/api/processes/{process.id}/ready-tasks/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(task["work_order"], task["status"]) for task in response.json()["results"]]
+    
+    def task(self, work_order, process):
+        return Task.objects.get(work_order=work_order, process=process)
+    
+    def test_ready_queue_follows_reports(self):
+        """测试报工后可开工任务移动到下一道工序"""
+        first, second = self.work_orders
+        self.assertEqual(self.ready(self.processes[0]), [(first.id, "pending"), (second.id, "pending")])
+        self.assertEqual(self.ready(self.processes[1]), [])
+        
+        self.client.patch(f"/api/tasks/{self.task(first, self.processes[0]).id}/", {"status": "unreported"}, format="json")
+        self.assertEqual(self.ready(self.processes[0]), [(first.id, "unreported"), (second.id, "pending")])
+        
+        self.client.post("/api/tasks/batch-report/", {"items": [
+            {"id": self.task(first, self.processes[0]).id, "status": "in_progress"},
+        ]}, format="json")
+        self.assertEqual(self.ready(self.processes[0]), [(second.id, "pending")])
+        
+        # 直接修改状态模拟完成报工
+        task = self.task(first, self.processes[0])
+        task.status = "completed"
+        task.save()
+        from .progress import rebuild_progress
+        rebuild_progress([first.id])
+        self.assertEqual(self.ready(self.processes[1]), [(first.id, "pending")])
+    
+    def test_route_step_move_updates_queue(self):
+        """测试调整工艺路线顺序后重新定位可开工任务"""
+        first = self.work_orders[0]
+        route_process = RouteProcess.objects.get(route=first.route, process=self.processes[2])
+        self.client.post(f"/api/routes/{first.route_id}/steps/{route_process.id}/move/", {"after": None}, format="json")
+        self.assertEqual(self.ready(self.processes[2]), [(first.id, "pending")])
+        self.assertEqual(self.ready(self.processes[0]), [(self.work_orders[1].id, "pending")])
+    
+    def test_ready_queue_query_count(self):
+        """测试可开工队列只查询工序和带索引的任务"""
+        with self.assertNumQueries(2):
+            self.client.get(f"/api/processes/{self.processes[0].id}/ready-tasks/")
+
+
+class RequestMetricsTestCase(TestCase):
+    """请求级性能指标和慢请求日志"""
+    def setUp(self):
+        from .metrics import request_metrics
+        request_metrics.clear()
+        cache.clear()
+        self.client = APIClient()
+        process = Process.objects.create(name="工序")
+        route = Route.objects.create(name="工艺路线")
+        work_order = WorkOrder.objects.create(name="工单", route=route)
+        Task.objects.bulk_create([Task(work_order=work_order, process=process) for _ in range(3)])
+    
+    def metrics(self):
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode("utf-8")
+    
+    def test_records_queries_per_view(self):
+        """测试按视图记录请求次数和SQL查询数"""
+        self.client.get("/api/tasks/")
+        self.client.get("/api/tasks/")
+        content = self.metrics()
+        self.assertIn('app_request_duration_seconds_count{view="task-list",method="GET"} 2', content)
+        self.assertIn('app_request_db_queries_sum{view="task-list",method="GET"} 2', content)
+        self.assertIn('app_request_db_queries_bucket{view="task-list",method="GET",le="0"} 0', content)
+        self.assertIn('app_request_db_queries_bucket{view="task-list",method="GET",le="1"} 2', content)
+        # 抓取接口本身不计入指标
+        self.assertNotIn('view="metrics"', self.metrics())
+    
+    async def test_records_async_view_queries(self):
+        """测试异步视图中的查询同样计入当前请求"""
+        from django.test import AsyncClient
+        await AsyncClient().get("/api/async/tasks/")
+        from .metrics import request_metrics
+        series = request_metrics.histograms['app_request_db_queries']
+        self.assertEqual([histogram.sum for histogram in series.values()], [1])
+    
+    def test_slow_request_log(self):
+        """测试超出查询数预算时记录慢请求日志"""
+        from django.test import override_settings
+        with override_settings(SLOW_REQUEST_QUERIES=0), self.assertLogs('app.metrics', level='WARNING') as logs:
+            self.client.get("/api/tasks/?status=pending")
+        self.assertIn("/api/tasks/?status=pending", logs.output[0])
+        self.assertIn("SQL查询 1 条", logs.output[0])
+
+
+class BenchmarkCommandTestCase(TestCase):
+    """合成数据生成和接口基准测试命令"""
+    def test_seed_and_benchmark(self):
+        """测试生成小规模数据后运行基准测试，查询数不超过阈值文件"""
+        import json
+        import tempfile
+        from io import StringIO
+        from pathlib import Path
+        from django.core.management import call_command
+        from .progress import rebuild_progress
+        
+        call_command('seed_data', processes=20, routes=30, min_steps=2, max_steps=12, tasks=100, stdout=StringIO())
+        self.assertEqual(Route.objects.count(), 30)
+        self.assertLessEqual(Task.objects.count(), 100)
+        # 生成的进度汇总与从任务表重建的一致
+        progress = list(WorkOrderProgress.objects.order_by('work_order_id').values())
+        rebuild_progress(list(WorkOrder.objects.values_list('id', flat=True)))
+        self.assertEqual(progress, list(WorkOrderProgress.objects.order_by('work_order_id').values()))
+        
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "results.json"
+            call_command('benchmark', iterations=2, warmup=1, output=str(output), stdout=StringIO())
+            results = json.loads(output.read_text(encoding='utf-8'))
+        self.assertIn('split.run', results['results'])
+        self.assertTrue(all(not result['errors'] for result in results['results'].values()))
+        # 基准测试中的写操作已回滚
+        self.assertEqual(progress, list(WorkOrderProgress.objects.order_by('work_order_id').values()))
+    
+    def test_seed_clear_skips_signals(self):
+        """测试 --clear 整表删除现有数据，不逐行触发模型信号"""
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        call_command('seed_data', processes=5, routes=4, min_steps=2, max_steps=3, tasks=10, stdout=StringIO())
+        route_etag = self.client.get("/api/routes/")["ETag"]
+        with mock.patch('app.signals.touch_route') as signal_touch:
+            call_command('seed_data', processes=3, routes=2, min_steps=2, max_steps=2, tasks=0, clear=True, stdout=StringIO())
+        signal_touch.assert_not_called()
+        self.assertEqual(Process.objects.count(), 3)
+        self.assertEqual(Route.objects.count(), 2)
+        self.assertEqual(RouteProcess.objects.count(), 4)
+        self.assertFalse(Task.objects.exists())
+        self.assertNotEqual(self.client.get("/api/routes/")["ETag"], route_etag)
+    
+    def test_check_regressions(self):
+        """测试查询数或耗时超出阈值及基线时报告回退"""
+        from .benchmarks import check_regressions
+        results = {'results': {'tasks.list': {'queries': 2, 'p95_ms': 30.0, 'errors': []}}}
+        self.assertEqual(check_regressions(results, {'tasks.list': {'queries': 2, 'p95_ms': 50}}), [])
+        failures = check_regressions(
+            results, {'tasks.list': {'queries': 1}},
+            baseline={'results': {'tasks.list': {'queries': 2, 'p95_ms': 10.0}}},
+        )
+        self.assertEqual(len(failures), 2)
+
+
+class ProfilerMiddlewareTestCase(TestCase):
+    """管理员按需开启的请求性能分析"""
+    def setUp(self):
+        import tempfile
+        from django.contrib.auth.models import User
+        from django.test import override_settings
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(PROFILER_DIR=directory.name, PROFILER_MAX_FILES=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        
+        self.staff = User.objects.create(username="admin", is_staff=True)
+        self.client = APIClient()
+        process = Process.objects.create(name="工序")
+        route = Route.objects.create(name="工艺路线")
+        work_order = WorkOrder.objects.create(name="工单", route=route)
+        Task.objects.bulk_create([Task(work_order=work_order, process=process) for _ in range(3)])
+    
+    def test_staff_request_with_header_is_profiled(self):
+        """测试管理员携带请求头时保存pstats和SQL记录"""
+        import json
+        import pstats
+        self.client.force_login(self.staff)
+        response = self.client.get("/api/tasks/", HTTP_X_PROFILE="1")
+        profile_id = response["X-Profile-Id"]
+        pstats.Stats(str(self.directory / f"{profile_id}.prof"))
+        summary = json.loads((self.directory / f"{profile_id}.sql.json").read_text(encoding="utf-8"))
+        self.assertEqual((summary["path"], summary["status"]), ("/api/tasks/", 200))
+        self.assertTrue(any('"app_task"' in query["sql"] for query in summary["queries"]))
+    
+    def test_requires_header_and_staff(self):
+        """测试未携带请求头或非管理员的请求不做分析"""
+        from django.contrib.auth.models import User
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/tasks/", HTTP_X_PROFILE="1"))
+        self.client.force_login(User.objects.create(username="worker"))
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/tasks/", HTTP_X_PROFILE="1"))
+        self.client.force_login(self.staff)
+        self.assertNotIn("X-Profile-Id", self.client.get("/api/tasks/"))
+        self.assertEqual(list(self.directory.iterdir()), [])
+    
+    def test_retention(self):
+        """测试只保留最近的若干次分析结果"""
+        self.client.force_login(self.staff)
+        ids = [self.client.get("/api/tasks/", HTTP_X_PROFILE="1")["X-Profile-Id"] for _ in range(3)]
+        self.assertEqual(sorted(path.stem for path in self.directory.glob("*.prof")), ids[1:])
+        self.assertEqual(len(list(self.directory.glob("*.sql.json"))), 2)
+    
+    async def test_async_request_is_profiled(self):
+        """测试ASGI下异步视图中的SQL同样被记录"""
+        import json
+        from django.test import AsyncClient
+        client = AsyncClient()
+        await client.aforce_login(self.staff)
+        response = await client.get("/api/async/tasks/", headers={"X-Profile": "1"})
+        summary = json.loads(
+            (self.directory / f"{response['X-Profile-Id']}.sql.json").read_text(encoding="utf-8")
+        )
+        self.assertEqual(summary["status"], 200)
+        self.assertTrue(any('"app_task"' in query["sql"] for query in summary["queries"]))
+
+
+class ValuesReadTestCase(TestCase):
+    """列表和详情接口的快速只读序列化"""
+    def setUp(self):
+        from .progress import rebuild_progress
+        self.client = APIClient()
+        process = Process.objects.create(name="工序\"引号\"")
+        route = Route.objects.create(name="工艺路线")
+        self.work_order = WorkOrder.objects.create(name="工单\n换行", route=route, status="approved")
+        WorkOrder.objects.create(name="没有进度汇总的工单", route=Route.objects.create(name="工艺路线2"))
+        Task.objects.bulk_create([
+            Task(work_order=self.work_order, process=process, status=task_status)
+            for task_status in ["completed", "in_progress", "pending", "pending", "unreported"]
+        ])
+        rebuild_progress([self.work_order.id])
+    
+    def assert_identical(self, viewset, urls):
+        """逐字节比较快速序列化与ModelSerializer的响应"""
+        from unittest import mock
+        fast = [self.client.get(url) for url in urls]
+        with mock.patch.object(viewset, 'values_serializer_class', None):
+            slow = [self.client.get(url) for url in urls]
+        for url, fast_response, slow_response in zip(urls, fast, slow):
+            self.assertEqual(fast_response.status_code, slow_response.status_code, url)
+            content = b"".join(fast_response.streaming_content) if fast_response.streaming else fast_response.content
+            expected = b"".join(slow_response.streaming_content) if slow_response.streaming else slow_response.content
+            self.assertEqual(content, expected, url)
+    
+    def test_tasks_identical(self):
+        from .views import TaskViewSet
+        task_id = Task.objects.first().id
+        self.assert_identical(TaskViewSet, [
+            "/api/tasks/", "/api/tasks/?page_size=2", "/api/tasks/?status=pending", f"/api/tasks/{task_id}/",
+            "/api/tasks/999999/", "/api/tasks/abc/", "/api/tasks/export/", "/api/tasks/export/?type=csv",
+        ])
+        # 翻页链接同样一致
+        next_url = self.client.get("/api/tasks/?page_size=2").json()["next"]
+        self.assert_identical(TaskViewSet, [next_url])
+    
+    def test_work_orders_identical(self):
+        from .views import WorkOrderViewSet
+        self.assert_identical(WorkOrderViewSet, [
+            "/api/workorders/", f"/api/workorders/{self.work_order.id}/", "/api/workorders/?status=draft",
+            "/api/workorders/export/?type=csv",
+        ])
+    
+    def test_async_views_use_values(self):
+        """测试异步接口的输出与同步接口一致"""
+        for name in ("tasks", "workorders"):
+            self.assertEqual(
+                self.client.get(f"/api/async/{name}/").json()["results"],
+                self.client.get(f"/api/{name}/").json()["results"],
+            )
+
+
+class FieldSelectionTestCase(TestCase):
+    """读接口的 fields 和 expand 参数"""
+    def setUp(self):
+        self.client = APIClient()
+        self.process = Process.objects.create(name="工序", description="说明")
+        self.route = Route.objects.create(name="工艺路线")
+        RouteProcess.objects.create(route=self.route, process=self.process, order=10)
+        self.work_order = WorkOrder.objects.create(name="工单", route=self.route)
+        self.task = Task.objects.create(work_order=self.work_order, process=self.process)
+    
+    def get(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+        return response.json(), [query['sql'] for query in captured.captured_queries]
+    
+    def test_sparse_fields_skip_joins(self):
+        """测试只返回请求的字段，且不为未请求的字段联表、预取或读取列"""
+        data, queries = self.get("/api/tasks/?fields=status,id")
+        self.assertEqual(data["results"], [{"id": self.task.id, "status": "pending"}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("JOIN", queries[0])
+        
+        data, queries = self.get("/api/routes/?fields=id,name")
+        self.assertEqual(data["results"], [{"id": self.route.id, "name": "工艺路线"}])
+        self.assertEqual(len(queries), 1)
+        
+        data, queries = self.get(f"/api/processes/{self.process.id}/?fields=name")
+        self.assertEqual(data, {"name": "工序"})
+        self.assertNotIn("description", queries[-1])
+        
+        data, queries = self.get("/api/workorders/?fields=id,name")
+        self.assertEqual(data["results"], [{"id": self.work_order.id, "name": "工单"}])
+        self.assertNotIn("JOIN", queries[0])
+        
+        # 未指定参数时输出完整字段
+        data, queries = self.get("/api/routes/")
+        self.assertEqual(data["results"][0]["processes"][0]["process"]["description"], "说明")
+        self.assertEqual(len(queries), 2)
+    
+    def test_expand(self):
+        """测试展开关联字段为嵌套对象"""
+        data, queries = self.get(f"/api/tasks/{self.task.id}/?fields=id,work_order,process&expand=process,work_order")
+        self.assertEqual(data, {
+            "id": self.task.id,
+            "work_order": {"id": self.work_order.id, "name": "工单", "status": "draft"},
+            "process": {"id": self.process.id, "name": "工序", "description": "说明"},
+        })
+        data, _ = self.get("/api/workorders/?fields=route&expand=route")
+        self.assertEqual(data["results"], [{"route": {"id": self.route.id, "name": "工艺路线"}}])
+    
+    def test_values_and_model_serializers_identical(self):
+        """测试快速只读序列化与ModelSerializer在字段选择和展开时的输出一致"""
+        from unittest import mock
+        from .views import TaskViewSet, WorkOrderViewSet
+        for viewset, urls in (
+            (TaskViewSet, [
+                "/api/tasks/?fields=id,status", "/api/tasks/?expand=work_order,process",
+                f"/api/tasks/{self.task.id}/?fields=process_name&expand=process",
+                "/api/tasks/export/?type=csv&fields=id,process&expand=process",
+            ]),
+            (WorkOrderViewSet, ["/api/workorders/?fields=id,progress", "/api/workorders/?expand=route"]),
+        ):
+            fast = [self.client.get(url) for url in urls]
+            with mock.patch.object(viewset, 'values_serializer_class', None):
+                slow = [self.client.get(url) for url in urls]
+            for url, fast_response, slow_response in zip(urls, fast, slow):
+                content = b"".join(fast_response.streaming_content) if fast_response.streaming else fast_response.content
+                expected = b"".join(slow_response.streaming_content) if slow_response.streaming else slow_response.content
+                self.assertEqual(content, expected, url)
+    
+    def test_async_views_and_cache(self):
+        """测试异步接口支持同样的参数，缓存按参数区分"""
+        self.assertEqual(
+            self.client.get("/api/async/tasks/?fields=id,process&expand=process").json()["results"],
+            self.client.get("/api/tasks/?fields=id,process&expand=process").json()["results"],
+        )
+        self.assertEqual(self.client.get("/api/async/routes/?fields=name").json()["results"], [{"name": "工艺路线"}])
+        self.assertEqual(self.client.get("/api/processes/?fields=id").json()["results"], [{"id": self.process.id}])
+        self.assertEqual(
+            self.client.get("/api/processes/?fields=name").json()["results"], [{"name": "工序"}]
+        )
+    
+    def test_invalid_parameters(self):
+        """测试未知字段或不可展开的字段返回400"""
+        for url in (
+            "/api/tasks/?fields=id,unknown", "/api/processes/?expand=name", "/api/routes/?expand=processes",
+            "/api/workorders/?expand=progress", "/api/async/tasks/?fields=unknown",
+        ):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn("error", response.json())
+
+
+class RendererTestCase(TestCase):
+    """orjson和MessagePack渲染器及解析器"""
+    def setUp(self):
+        self.client = APIClient()
+        self.process = Process.objects.create(name="工序 分隔")
+        route = Route.objects.create(name="工艺路线")
+        self.work_order = WorkOrder.objects.create(name="工单", route=route)
+        Task.objects.bulk_create([Task(work_order=self.work_order, process=self.process) for _ in range(3)])
+    
+    def test_orjson_matches_json_renderer(self):
+        """测试orjson渲染结果与DRF的JSONRenderer逐字节一致"""
+        from decimal import Decimal
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        response = self.client.get("/api/tasks/")
+        data = {"results": response.json()["results"], "decimal": Decimal("1.50"), "lazy": gettext_lazy("Yes")}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(response.content, JSONRenderer().render(response.json()))
+        # 请求缩进输出时使用标准实现
+        response = self.client.get("/api/tasks/", HTTP_ACCEPT="application/json; indent=2")
+        self.assertIn(b'\n  "next"', response.content)
+    
+    def test_msgpack_round_trip(self):
+        """测试通过内容协商读写MessagePack"""
+        import msgpack
+        response = self.client.get("/api/tasks/", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), self.client.get("/api/tasks/").json())
+        self.assertEqual(
+            msgpack.unpackb(self.client.get("/api/processes/?format=msgpack").content)["results"][0]["name"],
+            self.process.name,
+        )
+        
+        body = msgpack.packb({"work_order": self.work_order.id, "process": self.process.id, "status": "pending"})
+        response = self.client.post("/api/tasks/", body, content_type="application/msgpack", HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(msgpack.unpackb(response.content)["work_order"], self.work_order.id)
+        
+        response = self.client.post("/api/tasks/", b"\xc1", content_type="application/msgpack")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post("/api/tasks/", b"{", content_type="application/json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_browsable_api_only_in_debug(self):
+        """测试关闭DEBUG时不启用可浏览API"""
+        from Process_Table.settings import build_renderer_classes
+        self.assertNotIn('rest_framework.renderers.BrowsableAPIRenderer', build_renderer_classes(False))
+        self.assertIn('rest_framework.renderers.BrowsableAPIRenderer', build_renderer_classes(True))
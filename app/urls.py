@@ -1,6 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProcessViewSet, RouteViewSet, WorkOrderViewSet, TaskViewSet
+from .metrics import metrics_view
+from .views import (
+    ProcessViewSet, RouteViewSet, WorkOrderViewSet, TaskViewSet, SplitJobViewSet, WorkOrderSplitView,
+    AsyncTaskReadView, AsyncWorkOrderReadView, AsyncRouteReadView,
+)
 
 # 创建router实例
 router = DefaultRouter()
@@ -8,7 +12,18 @@ router.register(r'processes', ProcessViewSet)
 router.register(r'routes', RouteViewSet)
 router.register(r'workorders', WorkOrderViewSet)
 router.register(r'tasks', TaskViewSet)
+router.register(r'split-jobs', SplitJobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('workorders/<int:pk>/split/', WorkOrderSplitView.as_view()),
+    # ASGI部署下供终端轮询的异步只读接口
+    path('async/tasks/', AsyncTaskReadView.as_view()),
+    path('async/tasks/<int:pk>/', AsyncTaskReadView.as_view()),
+    path('async/workorders/', AsyncWorkOrderReadView.as_view()),
+    path('async/workorders/<int:pk>/', AsyncWorkOrderReadView.as_view()),
+    path('async/routes/', AsyncRouteReadView.as_view()),
+    path('async/routes/<int:pk>/', AsyncRouteReadView.as_view()),
+    # Prometheus格式的请求指标
+    path('metrics/', metrics_view, name='metrics'),
 ]
@@ -1,25 +1,425 @@
-from rest_framework import viewsets
+from rest_framework import generics, viewsets
+from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework import status
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, F, Min, Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views import View
+import csv
+import functools
+import itertools
+import json
 import logging
-from .models import Process, Route, WorkOrder, Task
-from .serializers import ProcessSerializer, RouteSerializer, WorkOrderSerializer, TaskSerializer
+import orjson
+from .cache import CachedReadMixin, route_structures
+from .jobs import enqueue_split, enqueue_splits
+from .models import Process, Route, WorkOrder, Task, RouteProcess, SplitJob, WorkOrderProgress
+from .progress import adjust_progress, refresh_route_progress, task_deltas
+from .renderers import ORJSONRenderer, encode_default
+from .serializers import (
+    ProcessSerializer, RouteSerializer, RouteProcessSerializer, WorkOrderSerializer, TaskSerializer,
+    TaskBatchReportSerializer, RouteStepInsertSerializer, RouteStepMoveSerializer, SplitJobSerializer,
+    WorkOrderBatchTransitionSerializer, WorkOrderValuesSerializer, TaskValuesSerializer, bulk_reorder, check_status_transition, order_key_between,
+)
 from rest_framework.views import APIView
 
 logger = logging.getLogger(__name__)
 
-class ProcessViewSet(viewsets.ModelViewSet):
+
+def parse_bool(value):
+    """解析查询参数中的布尔值"""
+    if value.lower() in ('true', '1'):
+        return True
+    if value.lower() in ('false', '0'):
+        return False
+    raise ValueError(value)
+
+
+def parse_choice(choices):
+    """生成校验枚举值的解析函数"""
+    values = {value for value, _ in choices}
+    
+    def parse(value):
+        if value not in values:
+            raise ValueError(value)
+        return value
+    return parse
+
+
+# 数据库整数主键的上限，超出时数据库驱动会抛出OverflowError
+MAX_ID = 2 ** 63 - 1
+
+
+def parse_id(value):
+    """解析查询参数中的主键，超出数据库整数范围时视为无效"""
+    parsed = int(value)
+    if not 0 <= parsed <= MAX_ID:
+        raise ValueError(value)
+    return parsed
+
+
+def filter_by_params(queryset, query_params, filter_params):
+    """按 filter_params 中声明的查询参数过滤查询集，参数无效时抛出ValidationError"""
+    filters = {}
+    for param, (lookup, parse) in filter_params.items():
+        value = query_params.get(param)
+        if value is None or value == '':
+            continue
+        try:
+            filters[lookup] = parse(value)
+        except ValueError:
+            raise ValidationError({"error": f"无效的筛选参数 {param}={value}。"})
+    return queryset.filter(**filters) if filters else queryset
+
+
+class QueryParamFilterMixin:
+    """根据 filter_params 中声明的查询参数在服务端过滤查询集
+    
+    filter_params 的格式为 {参数名: (ORM查询表达式, 解析函数)}。
+    """
+    filter_params = {}
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return filter_by_params(queryset, self.request.query_params, self.filter_params)
+
+
+@functools.lru_cache(maxsize=None)
+def readable_fields(serializer_class):
+    """序列化器的可读字段及其来源属性，按输出顺序排列"""
+    return {name: field.source for name, field in serializer_class().fields.items() if not field.write_only}
+
+
+def parse_field_list(query_params, param):
+    value = query_params.get(param)
+    if not value:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def parse_selection(query_params, serializer_class):
+    """解析 ?fields= 和 ?expand= 参数，返回 (按输出顺序排列的字段元组或None, 展开字段元组)，参数无效时抛出ValidationError"""
+    available = readable_fields(serializer_class)
+    expandable = getattr(serializer_class.Meta, 'expandable_fields', {})
+    fields = parse_field_list(query_params, 'fields')
+    expand = parse_field_list(query_params, 'expand') or []
+    unknown = [name for name in fields or [] if name not in available]
+    if unknown:
+        raise ValidationError({"error": f"未知的字段 {','.join(unknown)}，可选 {','.join(available)}。"})
+    unknown = [name for name in expand if name not in expandable]
+    if unknown:
+        raise ValidationError({"error": f"字段 {','.join(unknown)} 不可展开，可展开的字段：{','.join(expandable) or '无'}。"})
+    if fields is not None:
+        fields = tuple(name for name in available if name in fields)
+        # 只展开返回的字段
+        expand = [name for name in expand if name in fields]
+    return fields, tuple(name for name in expandable if name in expand)
+
+
+class FieldSelectionMixin:
+    """读接口（list、retrieve和流式导出）支持 ?fields= 只返回列出的字段，?expand= 把关联字段展开为嵌套对象
+
+    可展开的字段由序列化器的 Meta.expandable_fields 声明。未请求的字段不参与查询：
+    field_querysets（{输出字段: 查询集处理函数}）中的联表或预取只在请求了对应字段时执行，
+    使用ModelSerializer且查询集未联表时还通过 .only() 只读取请求的字段对应的列。
+    """
+    selection_actions = ('list', 'retrieve', 'export')
+    field_querysets = {}
+    selected_fields = None
+    expanded_fields = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.selection_actions:
+            self.selected_fields, self.expanded_fields = parse_selection(request.query_params, self.serializer_class)
+
+    def get_queryset(self):
+        return self.select_queryset(super().get_queryset(), self.selected_fields)
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.selected_fields)
+        kwargs.setdefault('expand', self.expanded_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    @classmethod
+    def select_queryset(cls, queryset, fields=None):
+        """只为请求的字段联表或预取；使用ModelSerializer序列化时只读取请求的字段对应的列"""
+        for name, prepare in cls.field_querysets.items():
+            if fields is None or name in fields:
+                queryset = prepare(queryset)
+        # 快速只读序列化自行选取列；已联表的查询集不能推迟关联字段，不做限制
+        if fields is not None and getattr(cls, 'values_serializer_class', None) is None and not queryset.query.select_related:
+            sources = readable_fields(cls.serializer_class)
+            columns = {field.name for field in queryset.model._meta.concrete_fields}
+            queryset = queryset.only('pk', *[sources[name] for name in fields if sources[name] in columns])
+        return queryset
+
+
+class ValuesReadMixin(FieldSelectionMixin):
+    """list、retrieve和流式导出使用 values_serializer_class 的快速只读序列化，输出与serializer_class一致"""
+    values_serializer_class = None
+
+    def get_values_serializer(self):
+        return self.values_serializer_class.select(self.selected_fields, self.expanded_fields)
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+        values_serializer = self.get_values_serializer()
+        queryset = values_serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serialize(page))
+        return Response(values_serializer.serialize(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().retrieve(request, *args, **kwargs)
+        values_serializer = self.get_values_serializer()
+        queryset = values_serializer.values(self.filter_queryset(self.get_queryset()))
+        row = generics.get_object_or_404(queryset, **{self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]})
+        return Response(values_serializer.to_representation(row))
+
+    def export_rows(self, queryset):
+        if self.values_serializer_class is None:
+            return super().export_rows(queryset)
+        values_serializer = self.get_values_serializer()
+        rows = values_serializer.values(queryset).iterator(chunk_size=self.export_chunk_size)
+        to_representation = values_serializer.to_representation
+        return (to_representation(row) for row in rows)
+
+
+class ProcessViewSet(FieldSelectionMixin, CachedReadMixin, viewsets.ModelViewSet):
     queryset = Process.objects.all()
     serializer_class = ProcessSerializer
 
-class RouteViewSet(viewsets.ModelViewSet):
+    def cache_dependencies(self):
+        if self.action == 'retrieve':
+            return [f"process:{self.kwargs['pk']}"]
+        return ['process']
+
+    def perform_destroy(self, instance):
+        # 删除工序会级联删除其任务，按工单汇总被删除任务的状态以更新进度
+        with transaction.atomic():
+            deltas = task_deltas()
+            for work_order_id, task_status, count in (
+                Task.objects.filter(process=instance).values_list('work_order_id', 'status')
+                .annotate(count=Count('id')).order_by()
+            ):
+                deltas[work_order_id][task_status] -= count
+            instance.delete()
+            adjust_progress(deltas)
+
+    @action(detail=True, methods=['get'], url_path='ready-tasks')
+    def ready_tasks(self, request, pk=None):
+        """工序的可开工队列：未生产或未报工且前置工序全部完成的任务，按任务ID分页"""
+        process = self.get_object()
+        queryset = Task.objects.select_related('work_order', 'process', 'route_process').filter(
+            process=process, is_ready=True
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = TaskSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+class CSVEcho:
+    """供csv.writer逐行写入并直接返回该行文本的伪缓冲区"""
+    def write(self, value):
+        return value
+
+
+class StreamingExportMixin:
+    """以NDJSON或CSV流式导出列表数据
+
+    分块迭代查询集并逐行序列化，输出字段与列表接口的序列化器一致，内存占用与行数无关。
+    ASGI下同步生成器会被Django一次性读入内存后才开始发送，因此改为逐块读取的异步迭代器。
+    """
+    export_chunk_size = 2000
+    export_types = {
+        'ndjson': 'application/x-ndjson; charset=utf-8',
+        'csv': 'text/csv; charset=utf-8',
+    }
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in self.export_types:
+            raise ValidationError({"error": f"不支持的导出格式 {export_type}，可选 ndjson 或 csv。"})
+        queryset = self.filter_queryset(self.get_queryset()).order_by('id')
+        serializer = self.get_serializer()
+        rows = self.export_rows(queryset)
+        if export_type == 'csv':
+            fields = [field.field_name for field in serializer.fields.values() if not field.write_only]
+            content = self.csv_lines(fields, rows)
+        else:
+            content = self.ndjson_lines(rows)
+        if isinstance(request._request, ASGIRequest):
+            content = self.async_chunks(content)
+        response = StreamingHttpResponse(content, content_type=self.export_types[export_type])
+        response['Content-Disposition'] = f'attachment; filename="{self.basename}.{export_type}"'
+        return response
+
+    def export_rows(self, queryset):
+        serializer = self.get_serializer()
+        return (serializer.to_representation(obj) for obj in queryset.iterator(chunk_size=self.export_chunk_size))
+
+    async def async_chunks(self, lines):
+        """在同步线程中每次取出 export_chunk_size 行，拼接后逐块发送"""
+        take = sync_to_async(lambda: list(itertools.islice(lines, self.export_chunk_size)))
+        try:
+            while True:
+                chunk = await take()
+                if not chunk:
+                    return
+                yield chunk[0][:0].join(chunk)
+        finally:
+            # 客户端提前断开时同样释放查询游标
+            await sync_to_async(lines.close)()
+
+    def ndjson_lines(self, rows):
+        for row in rows:
+            yield orjson.dumps(row, default=encode_default, option=orjson.OPT_APPEND_NEWLINE)
+
+    def csv_lines(self, fields, rows):
+        writer = csv.writer(CSVEcho())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([self.csv_value(row.get(field)) for field in fields])
+
+    def csv_value(self, value):
+        # 嵌套的字典或列表以JSON写入单元格
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+        return value
+
+
+def prefetch_route_steps(queryset):
+    # 预取工序关系及其工序，避免序列化嵌套工序时逐条查询
+    return queryset.prefetch_related(
+        Prefetch('routeprocess_set', queryset=RouteProcess.objects.select_related('process').order_by('order'))
+    )
+
+
+class RouteViewSet(FieldSelectionMixin, CachedReadMixin, viewsets.ModelViewSet):
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
+    # 只在返回工序时预取
+    field_querysets = {'processes': prefetch_route_steps}
+    step_actions = ('insert_step', 'move_step', 'remove_step')
+
+    def create(self, request, *args, **kwargs):
+        # 提交数组时批量创建多条工艺路线
+        many = isinstance(request.data, list)
+        serializer = self.get_serializer(data=request.data, many=many)
+        serializer.is_valid(raise_exception=True)
+        routes = serializer.save() if many else [serializer.save()]
+        # 重新按预取方式查询新建的工艺路线用于返回，避免逐条查询工序
+        routes = self.get_queryset().filter(id__in=[route.id for route in routes]).order_by('id')
+        data = self.get_serializer(routes, many=True).data
+        if many:
+            logger.info(f"批量创建工艺路线 {len(data)} 条。")
+        return Response(data if many else data[0], status=status.HTTP_201_CREATED)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            route = serializer.save()
+            refresh_route_progress(route.id)
 
-class WorkOrderViewSet(viewsets.ModelViewSet):
-    queryset = WorkOrder.objects.all()
+    def cache_dependencies(self):
+        # 工艺路线中嵌套了工序详情，因此同时依赖工序的版本号
+        if self.action == 'retrieve':
+            return ['process', f"route:{self.kwargs['pk']}"]
+        return ['process', 'route']
+
+    def get_queryset(self):
+        # 单步编辑只需锁定工艺路线本身，不预取全部工序
+        if self.action in self.step_actions:
+            return Route.objects.select_for_update()
+        return super().get_queryset()
+
+    @action(detail=True, methods=['post'], url_path='steps')
+    def insert_step(self, request, pk=None):
+        """在指定工序之后插入一道工序，通常只需插入一行"""
+        serializer = RouteStepInsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            route = self.get_object()
+            step = RouteProcess(route=route, process=serializer.validated_data['process'])
+            step.order = self.place_step(route, serializer.validated_data['after'])
+            step.save()
+            refresh_route_progress(route.id)
+        return Response(RouteProcessSerializer(step).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], url_path=r'steps/(?P<step_id>\d+)/move')
+    def move_step(self, request, pk=None, step_id=None):
+        """把工序移动到指定工序之后，通常只需修改一行"""
+        serializer = RouteStepMoveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        after = serializer.validated_data['after']
+        with transaction.atomic():
+            route = self.get_object()
+            step = get_object_or_404(RouteProcess.objects.select_related('process'), pk=step_id, route=route)
+            if after == step.id:
+                raise ValidationError({"error": "不能把工序移动到自身之后。"})
+            step.order = self.place_step(route, after, exclude_id=step.id)
+            step.save(update_fields=['order'])
+            refresh_route_progress(route.id)
+        return Response(RouteProcessSerializer(step).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['delete'], url_path=r'steps/(?P<step_id>\d+)')
+    def remove_step(self, request, pk=None, step_id=None):
+        """从工艺路线中删除一道工序"""
+        with transaction.atomic():
+            route = self.get_object()
+            step = get_object_or_404(RouteProcess, pk=step_id, route=route)
+            step.delete()
+            refresh_route_progress(route.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def place_step(self, route, after_id, exclude_id=None):
+        """计算放在after_id对应工序之后的顺序值，间隔用尽时先重新编号"""
+        steps = RouteProcess.objects.filter(route=route)
+        if exclude_id is not None:
+            steps = steps.exclude(pk=exclude_id)
+        if after_id is None:
+            prev_order = None
+            next_order = steps.aggregate(Min('order'))['order__min']
+        else:
+            prev_order = steps.filter(pk=after_id).values_list('order', flat=True).first()
+            if prev_order is None:
+                raise ValidationError({"error": "指定的前一道工序不属于该工艺路线。"})
+            next_order = steps.filter(order__gt=prev_order).aggregate(Min('order'))['order__min']
+        
+        order = order_key_between(prev_order, next_order)
+        if order is None:
+            self.renumber_steps(route)
+            return self.place_step(route, after_id, exclude_id)
+        return order
+
+    def renumber_steps(self, route):
+        """按当前顺序把工艺路线的全部工序重新编号为等间隔的顺序值"""
+        steps = list(RouteProcess.objects.filter(route=route).order_by('order'))
+        floor = min([step.order for step in steps] + [RouteProcess.ORDER_GAP])
+        for index, step in enumerate(steps):
+            step.order = (index + 1) * RouteProcess.ORDER_GAP
+        bulk_reorder(steps, floor)
+        logger.info(f"工艺路线 {route.id} 顺序间隔用尽，已重新编号 {len(steps)} 道工序。")
+
+class WorkOrderViewSet(ValuesReadMixin, QueryParamFilterMixin, StreamingExportMixin, viewsets.ModelViewSet):
+    # 联表取出进度汇总，任务数量和各状态计数直接读取汇总记录
+    queryset = WorkOrder.objects.select_related('progress')
     serializer_class = WorkOrderSerializer
+    values_serializer_class = WorkOrderValuesSerializer
+    filter_params = {
+        'status': ('status', parse_choice(WorkOrder.STATUS_CHOICES)),
+        'is_scheduled': ('is_scheduled', parse_bool),
+        'route': ('route_id', parse_id),
+    }
 
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -52,61 +452,132 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         
         return super().update(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            work_order = serializer.save()
+            WorkOrderProgress.objects.create(work_order=work_order)
+
     def destroy(self, request, *args, **kwargs):
         instance = self.get_object()
         if instance.is_scheduled:
             return Response({"error": "已排产的工单不可删除。"}, status=status.HTTP_400_BAD_REQUEST)
         return super().destroy(request, *args, **kwargs)
 
-    def split_work_order(self, work_order):
-        # 拆分工单的逻辑
-        try:
-            # 获取工单关联的工艺路线中的所有工序，并按照顺序字段排序
-            route_processes = work_order.route.routeprocess_set.all().order_by('order')
-            
-            # 记录创建/更新的任务数量
-            created_count = 0
-            
-            # 获取当前工单的所有任务
-            existing_tasks = Task.objects.filter(work_order=work_order)
-            
-            # 获取当前工艺路线中的所有 RouteProcess 的 ID
-            current_route_process_ids = [rp.id for rp in route_processes]
+    @action(detail=False, methods=['post'], url_path='batch-transition')
+    def batch_transition(self, request):
+        """批量变更工单状态（提交、审核等），审核时可同时提交拆分，返回每个工单的处理结果"""
+        serializer = WorkOrderBatchTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        new_status = serializer.validated_data['status']
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        
+        with transaction.atomic():
+            work_orders = WorkOrder.objects.select_for_update().filter(id__in=ids).only('id', 'status', 'is_scheduled')
+            work_orders = {work_order.id: work_order for work_order in work_orders}
+            results = []
+            accepted_ids = []
+            for work_order_id in ids:
+                work_order = work_orders.get(work_order_id)
+                error = "工单不存在。" if work_order is None else self.check_transition(work_order, new_status)
+                if error:
+                    results.append({"id": work_order_id, "success": False, "error": error})
+                    continue
+                accepted_ids.append(work_order_id)
+                results.append({"id": work_order_id, "success": True, "status": new_status})
             
-            # 删除不在当前工艺路线中的工序对应的任务
-            for task in existing_tasks:
-                if task.route_process.id not in current_route_process_ids:
-                    task.delete()
-                    logger.debug(f"删除任务: 工单={work_order.id}, 工序={task.process.id}({task.process.name})")
-
-            for route_process in route_processes:
-                # 检查是否已存在与该RouteProcess关联的任务
-                existing_task = Task.objects.filter(
-                    work_order=work_order,
-                    route_process=route_process
-                ).first()
-                
-                if not existing_task:
-                    # 创建新任务，并关联到当前的RouteProcess
-                    task = Task.objects.create(
+            WorkOrder.objects.filter(id__in=accepted_ids).update(status=new_status)
+            if serializer.validated_data['split'] and accepted_ids:
+                jobs, coalesced = enqueue_splits(accepted_ids)
+                for result in results:
+                    job = jobs.get(result["id"]) if result["success"] else None
+                    if job is not None:
+                        result.update(split_job=job.id, coalesced=result["id"] in coalesced)
+        
+        logger.info(f"批量变更工单状态为 {new_status}，共 {len(ids)} 个，成功 {len(accepted_ids)} 个。")
+        return Response({"updated": len(accepted_ids), "results": results}, status=status.HTTP_200_OK)
+
+    def check_transition(self, work_order, new_status):
+        """按update和validate_status的规则检查工单能否只变更状态，返回错误信息或None"""
+        if work_order.status == "draft" and work_order.is_scheduled:
+            return "已排产的工单只能修改工艺路线。"
+        return check_status_transition(work_order.status, new_status)
+
+    def split_work_order(self, work_order, fresh=False):
+        """按工艺路线拆分工单：在内存中比对现有任务与工艺路线，再批量删除/创建，返回各类任务数量
+
+        fresh为True时在事务中从数据库读取工艺路线结构，不使用进程内缓存。
+        """
+        try:
+            with transaction.atomic():
+                # 读取工单关联的工艺路线结构（按顺序排列的工序）
+                if fresh:
+                    structure = route_structures.load(work_order.route_id)
+                else:
+                    structure = route_structures.get(work_order.route_id)
+                route_processes = list(zip(structure.route_process_ids, structure.process_ids))
+                current_route_process_ids = structure.positions
+
+                # 一次性取出当前工单的所有任务，按是否仍在工艺路线中分为保留和删除两类
+                existing_tasks = Task.objects.filter(work_order=work_order).values_list('id', 'route_process_id', 'status')
+                kept_route_process_ids = set()
+                kept_count = 0
+                stale_task_ids = []
+                stale_statuses = []
+                for task_id, route_process_id, task_status in existing_tasks:
+                    if route_process_id in current_route_process_ids:
+                        kept_route_process_ids.add(route_process_id)
+                        kept_count += 1
+                    else:
+                        # 关联的RouteProcess已被删除（为空）或不属于当前工艺路线
+                        stale_task_ids.append(task_id)
+                        stale_statuses.append(task_status)
+
+                removed_count = 0
+                if stale_task_ids:
+                    removed_count, _ = Task.objects.filter(id__in=stale_task_ids).delete()
+
+                # 为尚无任务的RouteProcess批量创建任务
+                new_tasks = [
+                    Task(
                         work_order=work_order,
-                        process=route_process.process,
+                        process_id=process_id,
                         status="pending",
-                        route_process=route_process  # 关联到RouteProcess实例
+                        route_process_id=rp_id,  # 关联到RouteProcess实例
                     )
-                    created_count += 1
-                    
-                    # 记录日志，包含RouteProcess的ID和顺序
-                    logger.debug(f"创建任务: 工单={work_order.id}, 工序={route_process.process.id}({route_process.process.name}), 顺序={route_process.order}")
-            
-            logger.info(f"工单 {work_order.id} 拆分成功，共创建 {created_count} 个新任务，工艺路线总工序数 {len(route_processes)}。")
+                    for rp_id, process_id in route_processes
+                    if rp_id not in kept_route_process_ids
+                ]
+                Task.objects.bulk_create(new_tasks)
+                adjust_progress(task_deltas(
+                    removed=[(work_order.id, task_status) for task_status in stale_statuses],
+                    added=[(work_order.id, task.status) for task in new_tasks],
+                ))
+
+            result = {
+                "created": len(new_tasks),
+                "kept": kept_count,
+                "removed": removed_count,
+            }
+            logger.info(
+                f"工单 {work_order.id} 拆分成功，新建 {result['created']} 个任务，保留 {result['kept']} 个，"
+                f"删除 {result['removed']} 个，工艺路线总工序数 {len(route_processes)}。"
+            )
+            return result
         except Exception as e:
             logger.error(f"工单 {work_order.id} 拆分失败: {str(e)}")
             raise ValidationError({"error": "工单拆分失败，请联系管理员。"})
 
-class TaskViewSet(viewsets.ModelViewSet):
-    queryset = Task.objects.all()
+class TaskViewSet(ValuesReadMixin, QueryParamFilterMixin, StreamingExportMixin, viewsets.ModelViewSet):
+    # 联表取出工单、工序和工艺路线工序关系，供序列化名称和状态校验使用
+    queryset = Task.objects.select_related('work_order', 'process', 'route_process')
     serializer_class = TaskSerializer
+    values_serializer_class = TaskValuesSerializer
+    filter_params = {
+        'status': ('status', parse_choice(Task.STATUS_CHOICES)),
+        'work_order': ('work_order_id', parse_id),
+        'process': ('process_id', parse_id),
+        'is_scheduled': ('work_order__is_scheduled', parse_bool),
+    }
     
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
@@ -117,8 +588,99 @@ class TaskViewSet(viewsets.ModelViewSet):
                 raise ValidationError({"error": "已排产工单的进行中或已完成任务不允许修改。"})
         return super().update(request, *args, **kwargs)
 
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            task = serializer.save()
+            adjust_progress(task_deltas(added=[(task.work_order_id, task.status)]))
+
+    def perform_update(self, serializer):
+        removed = [(serializer.instance.work_order_id, serializer.instance.status)]
+        with transaction.atomic():
+            task = serializer.save()
+            adjust_progress(task_deltas(removed=removed, added=[(task.work_order_id, task.status)]))
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            adjust_progress(task_deltas(removed=[(instance.work_order_id, instance.status)]))
+
+    @action(detail=False, methods=['post'], url_path='batch-report')
+    def batch_report(self, request):
+        """批量报工：一次提交多个任务的状态变更，返回每条变更的处理结果"""
+        serializer = TaskBatchReportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = self.report_tasks(serializer.validated_data['items'])
+        updated = sum(1 for result in results if result['success'])
+        return Response({"updated": updated, "results": results}, status=status.HTTP_200_OK)
+
+    def report_tasks(self, items):
+        """在内存中按顺序校验并应用任务状态变更，最后批量写回数据库"""
+        with transaction.atomic():
+            task_ids = {item['id'] for item in items}
+            tasks = {
+                task.id: task
+                for task in Task.objects.select_related('work_order', 'route_process').filter(id__in=task_ids)
+            }
+            
+            # 一次性加载涉及的已排产工单中，属于其工艺路线的所有任务的顺序和状态
+            scheduled_work_order_ids = {task.work_order_id for task in tasks.values() if task.work_order.is_scheduled}
+            route_tasks = {}  # 工单ID -> [[工序顺序, 任务ID]]
+            task_states = {}  # 任务ID -> 当前状态（随批次内的变更同步更新）
+            for task_id, work_order_id, order, task_status in (
+                Task.objects.filter(
+                    work_order_id__in=scheduled_work_order_ids,
+                    route_process__route_id=F('work_order__route_id'),
+                ).values_list('id', 'work_order_id', 'route_process__order', 'status')
+            ):
+                route_tasks.setdefault(work_order_id, []).append((order, task_id))
+                task_states[task_id] = task_status
+            
+            original_statuses = {task.id: task.status for task in tasks.values()}
+            results = []
+            changed = {}
+            for item in items:
+                task = tasks.get(item['id'])
+                error = self.check_report(task, route_tasks, task_states)
+                if error:
+                    results.append({"id": item['id'], "success": False, "error": error})
+                    continue
+                task.status = item['status']
+                task_states[task.id] = task.status
+                changed[task.id] = task
+                results.append({"id": task.id, "success": True, "status": task.status})
+            
+            Task.objects.bulk_update(list(changed.values()), ['status'])
+            adjust_progress(task_deltas(
+                removed=[(task.work_order_id, original_statuses[task.id]) for task in changed.values()],
+                added=[(task.work_order_id, task.status) for task in changed.values()],
+            ))
+        
+        logger.info(f"批量报工完成，共 {len(items)} 条，成功 {sum(1 for r in results if r['success'])} 条。")
+        return results
+
+    def check_report(self, task, route_tasks, task_states):
+        """按TaskSerializer.validate的规则检查单个任务能否变更状态，返回错误信息或None"""
+        if task is None:
+            return "任务不存在。"
+        if not task.work_order.is_scheduled:
+            return None
+        current_status = task_states.get(task.id, task.status)
+        if current_status in ["in_progress", "completed"]:
+            return "已排产工单的进行中或已完成任务不允许修改。"
+        if task.route_process is None:
+            # 如果没有关联的RouteProcess，则跳过前后置工序的验证
+            return None
+        
+        current_order = task.route_process.order
+        siblings = route_tasks.get(task.work_order_id, [])
+        if any(order < current_order and task_states[task_id] != "completed" for order, task_id in siblings):
+            return "只有当前置所有工序已完成时，才能修改该工序的状态。"
+        if any(order > current_order and task_states[task_id] != "pending" for order, task_id in siblings):
+            return "只有当后置所有工序为未生产状态时，才能修改该工序的状态。"
+        return None
+
 class WorkOrderSplitView(APIView):
-    """专门用于拆分工单的API视图"""
+    """专门用于拆分工单的API视图，拆分任务入队后立即返回，由后台工作进程执行"""
     
     def post(self, request, pk):
         try:
@@ -127,17 +689,97 @@ class WorkOrderSplitView(APIView):
             if work_order.status != "approved":
                 return Response({"error": "只有已审核的工单才能拆分。"}, status=status.HTTP_400_BAD_REQUEST)
             
-            # 调用拆分工单的方法
-            WorkOrderViewSet().split_work_order(work_order)
-            
-            # 更新工单的已排产状态
-            work_order.is_scheduled = True
-            work_order.save()
-            
-            serializer = WorkOrderSerializer(work_order)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # 创建拆分任务，同一工单重复提交时合并到已有任务
+            job, coalesced = enqueue_split(work_order)
+            data = dict(SplitJobSerializer(job).data, coalesced=coalesced)
+            return Response(data, status=status.HTTP_202_ACCEPTED)
         except WorkOrder.DoesNotExist:
             return Response({"error": "工单不存在。"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             logger.error(f"拆分工单 {pk} 失败: {str(e)}")
-            return Response({"error": "拆分工单失败，请联系管理员。"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            return Response({"error": "拆分工单失败，请联系管理员。"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class SplitJobViewSet(QueryParamFilterMixin, viewsets.ReadOnlyModelViewSet):
+    """查询工单拆分任务的状态和结果"""
+    queryset = SplitJob.objects.all()
+    serializer_class = SplitJobSerializer
+    filter_params = {
+        'status': ('status', parse_choice(SplitJob.STATUS_CHOICES)),
+        'work_order': ('work_order_id', parse_id),
+    }
+
+
+class AsyncReadView(View):
+    """ASGI部署下的异步只读接口，使用Django异步ORM查询，等待数据库时不占用工作线程
+
+    复用对应DRF视图集的查询集（已联表/预取/注解）、序列化器、筛选参数以及 fields/expand 参数，
+    每条记录的字段及JSON编码与同步接口一致。与同步接口不同的是：列表按id升序分页，使用 after
+    （上一页最后一条的id）和 page_size 参数翻页，分页信封只有 next 和 results；只输出JSON，不支持MessagePack。
+    """
+    viewset_class = None
+    page_size = 100
+    max_page_size = 1000
+
+    async def get(self, request, pk=None):
+        serializer_class = self.viewset_class.serializer_class
+        try:
+            fields, expand = parse_selection(request.GET, serializer_class)
+        except ValidationError as exc:
+            return self.json_response(exc.detail, status_code=status.HTTP_400_BAD_REQUEST)
+        queryset = self.viewset_class.select_queryset(self.viewset_class.queryset.all(), fields)
+        # 视图集声明了快速只读序列化时同样使用，输出一致
+        values_serializer_class = getattr(self.viewset_class, 'values_serializer_class', None)
+        if values_serializer_class is not None:
+            values_serializer = values_serializer_class.select(fields, expand)
+            queryset = values_serializer.values(queryset)
+            to_representation = values_serializer.to_representation
+            serialize = values_serializer.serialize
+        else:
+            to_representation = lambda instance: serializer_class(instance, fields=fields, expand=expand).data
+            serialize = lambda rows: serializer_class(rows, many=True, fields=fields, expand=expand).data
+        if pk is not None:
+            instance = await queryset.filter(pk=pk).afirst()
+            if instance is None:
+                return self.json_response({"detail": "未找到。"}, status_code=status.HTTP_404_NOT_FOUND)
+            return self.json_response(to_representation(instance))
+
+        try:
+            queryset = filter_by_params(
+                queryset, request.GET, getattr(self.viewset_class, 'filter_params', {})
+            )
+            after = parse_id(request.GET.get('after', 0))
+            page_size = min(int(request.GET.get('page_size', self.page_size)), self.max_page_size)
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValidationError as exc:
+            return self.json_response(exc.detail, status_code=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return self.json_response({"error": "无效的分页参数。"}, status_code=status.HTTP_400_BAD_REQUEST)
+
+        # 多取一条用于判断是否还有下一页
+        rows = [obj async for obj in queryset.filter(id__gt=after).order_by('id')[:page_size + 1]]
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            params = request.GET.copy()
+            params['after'] = rows[-1].id
+            next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+        return self.json_response({"next": next_url, "results": serialize(rows)})
+
+    def json_response(self, data, status_code=status.HTTP_200_OK):
+        # 与同步接口使用同一渲染器，编码结果一致
+        renderer = ORJSONRenderer()
+        return HttpResponse(renderer.render(data), status=status_code, content_type=renderer.media_type)
+
+
+class AsyncTaskReadView(AsyncReadView):
+    viewset_class = TaskViewSet
+
+
+class AsyncWorkOrderReadView(AsyncReadView):
+    viewset_class = WorkOrderViewSet
+
+
+class AsyncRouteReadView(AsyncReadView):
+    viewset_class = RouteViewSet
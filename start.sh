@@ -1,13 +1,19 @@
 #!/bin/bash
 # 文件已改为 unix 格式
-# 只有当前目录不存在db.sqlite3时才会执行以下操作，即初始化
-if [ ! -f "db.sqlite3" ]; then
-    echo "初始化数据库……"
-
-    # 运行数据库迁移
-    python manage.py makemigrations app
-    python manage.py migrate
-fi
+# 任何一步失败都不再启动应用
+set -e
+
+# 每次启动都生成并应用数据库迁移：首次启动时初始化数据库，
+# 已有数据库同样会补齐新增的表、字段、索引和约束，必须在重建进度汇总和启动工作进程之前完成
+echo "应用数据库迁移……"
+python manage.py makemigrations app
+python manage.py migrate
+
+# 补齐缺少进度汇总的工单
+python manage.py rebuild_progress
+
+# 启动后台拆分工单工作进程
+python manage.py run_split_workers &
 
 # 启动应用
 uvicorn Process_Table.asgi:application --host 0.0.0.0 --port 8000